@@ -4,15 +4,17 @@ Routes file to handle API endpoints and page rendering
 """
 
 import os
-import json
 import uuid
 from datetime import datetime
-from flask import Blueprint, render_template, jsonify, request, current_app
+from flask import Blueprint, render_template, jsonify, request, current_app, url_for
 
-# Create a Blueprint for Alice
+from change_stream import ChangeStream
+from stores import JsonStore, read_collections
+from static_assets import StaticAssets
+
+# Create a Blueprint for Alice; its static files are served by send_static below
 alice_bp = Blueprint('alice', __name__, 
-                     template_folder='templates',
-                     static_folder='static')
+                     template_folder='templates')
 
 # Define the paths
 BASE_DOCS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'docs')
@@ -22,6 +24,8 @@ DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file_
 # Make sure the necessary directories exist
 if not os.path.exists(STORY_PATH):
     os.makedirs(STORY_PATH)
+if not os.path.exists(DATA_PATH):
+    os.makedirs(DATA_PATH)
 
 # Data files
 CHARACTERS_FILE = os.path.join(DATA_PATH, 'characters.json')
@@ -30,63 +34,102 @@ QUESTS_FILE = os.path.join(DATA_PATH, 'quests.json')
 DIALOGUES_FILE = os.path.join(DATA_PATH, 'dialogues.json')
 STORY_ARCS_FILE = os.path.join(DATA_PATH, 'story_arcs.json')
 
-# Initialize data files if they don't exist
-data_files = {
-    CHARACTERS_FILE: [],
-    LOCATIONS_FILE: [],
-    QUESTS_FILE: [],
-    DIALOGUES_FILE: [],
-    STORY_ARCS_FILE: []
-}
+# Collections stay in memory once loaded and are flushed back to their files in the background
+characters_store = JsonStore('characters', CHARACTERS_FILE)
+locations_store = JsonStore('locations', LOCATIONS_FILE)
+quests_store = JsonStore('quests', QUESTS_FILE)
+dialogues_store = JsonStore('dialogues', DIALOGUES_FILE)
+story_arcs_store = JsonStore('story_arcs', STORY_ARCS_FILE)
+
+# Every write is logged with a revision, so clients can ask for ?since=<rev>
+changes = ChangeStream(history_size=int(os.environ.get('ALICE_CHANGE_LOG_SIZE', 1000)))
 
-for file_path, default_data in data_files.items():
-    if not os.path.exists(file_path):
-        with open(file_path, 'w') as f:
-            json.dump(default_data, f)
+# Fingerprinted, precompressed static files, shared cache with the main app
+alice_assets = StaticAssets(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static'),
+                            os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cache', 'assets'))
 
 # Routes
 @alice_bp.route('/')
 def index():
     return render_template('alice_index.html')
 
+@alice_bp.route('/static/<path:path>')
+def send_static(path):
+    return alice_assets.send(path)
+
+@alice_bp.context_processor
+def asset_helpers():
+    return {"alice_asset_url": lambda path: url_for('alice.send_static', path=alice_assets.asset_url(path))}
+
+def resync_response():
+    return jsonify({"success": True, "resync": True, "rev": changes.cursor()})
+
+def collection_response(store):
+    """Every record of a collection, or only the changes after ?since=<rev>.
+
+    Full responses carry the cursor for the next since in X-Change-Rev.
+    """
+    if 'since' in request.args:
+        delta = changes.delta(request.args['since'], [store.name])
+        if delta is None:
+            return resync_response()
+        return jsonify(dict(delta["collections"][store.name], success=True, resync=False, rev=delta["rev"]))
+    
+    rev = changes.cursor()
+    response = jsonify(store.all())
+    response.headers['X-Change-Rev'] = rev
+    return response
+
+# All collections in one response for the first load, each with its version
+BOOTSTRAP_STORES = [characters_store, locations_store, quests_store, dialogues_store, story_arcs_store]
+
+@alice_bp.route('/api/bootstrap', methods=['GET'])
+def bootstrap():
+    if 'since' in request.args:
+        delta = changes.delta(request.args['since'], [store.name for store in BOOTSTRAP_STORES])
+        if delta is None:
+            return resync_response()
+        return jsonify(dict(delta, success=True, resync=False))
+    
+    rev = changes.cursor()
+    etag = '.'.join(store.version() for store in BOOTSTRAP_STORES)
+    if request.if_none_match.contains_weak(etag):
+        response = current_app.response_class(status=304)
+    else:
+        snapshots = read_collections(BOOTSTRAP_STORES)
+        collections = {name: {"version": version, "items": items} for name, (version, items) in snapshots.items()}
+        etag = '.'.join(version for version, _ in snapshots.values())
+        response = jsonify({"success": True, "rev": rev, "collections": collections})
+    response.set_etag(etag, weak=True)
+    response.cache_control.no_cache = True
+    response.headers['X-Change-Rev'] = rev
+    return response
+
 # Character Routes
 @alice_bp.route('/api/characters', methods=['GET', 'POST'])
 def handle_characters():
     if request.method == 'GET':
-        # Get all characters
-        if os.path.exists(CHARACTERS_FILE):
-            with open(CHARACTERS_FILE, 'r') as f:
-                return jsonify(json.load(f))
-        return jsonify([])
+        # Get all characters, or the changes after ?since=
+        return collection_response(characters_store)
     
     elif request.method == 'POST':
         # Add or update a character
         character_data = request.json
         
-        # Load existing characters
-        characters = []
-        if os.path.exists(CHARACTERS_FILE):
-            with open(CHARACTERS_FILE, 'r') as f:
-                characters = json.load(f)
-        
         # Add or update character
         if 'id' in character_data:
             # Update existing character
-            for i, character in enumerate(characters):
-                if character['id'] == character_data['id']:
-                    character_data['modified'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                    characters[i] = character_data
-                    break
+            if characters_store.get(character_data['id']) is not None:
+                character_data['modified'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                characters_store.put(character_data)
+                changes.publish('characters', 'upsert', character_data)
         else:
             # Create new character
             character_data['id'] = str(uuid.uuid4())
             character_data['created'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             character_data['modified'] = character_data['created']
-            characters.append(character_data)
-        
-        # Save characters back to file
-        with open(CHARACTERS_FILE, 'w') as f:
-            json.dump(characters, f, indent=2)
+            characters_store.put(character_data)
+            changes.publish('characters', 'upsert', character_data)
         
         return jsonify({"success": True, "id": character_data['id']})
 
@@ -94,40 +137,27 @@ def handle_characters():
 @alice_bp.route('/api/locations', methods=['GET', 'POST'])
 def handle_locations():
     if request.method == 'GET':
-        # Get all locations
-        if os.path.exists(LOCATIONS_FILE):
-            with open(LOCATIONS_FILE, 'r') as f:
-                return jsonify(json.load(f))
-        return jsonify([])
+        # Get all locations, or the changes after ?since=
+        return collection_response(locations_store)
     
     elif request.method == 'POST':
         # Add or update a location
         location_data = request.json
         
-        # Load existing locations
-        locations = []
-        if os.path.exists(LOCATIONS_FILE):
-            with open(LOCATIONS_FILE, 'r') as f:
-                locations = json.load(f)
-        
         # Add or update location
         if 'id' in location_data:
             # Update existing location
-            for i, location in enumerate(locations):
-                if location['id'] == location_data['id']:
-                    location_data['modified'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                    locations[i] = location_data
-                    break
+            if locations_store.get(location_data['id']) is not None:
+                location_data['modified'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                locations_store.put(location_data)
+                changes.publish('locations', 'upsert', location_data)
         else:
             # Create new location
             location_data['id'] = str(uuid.uuid4())
             location_data['created'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             location_data['modified'] = location_data['created']
-            locations.append(location_data)
-        
-        # Save locations back to file
-        with open(LOCATIONS_FILE, 'w') as f:
-            json.dump(locations, f, indent=2)
+            locations_store.put(location_data)
+            changes.publish('locations', 'upsert', location_data)
         
         return jsonify({"success": True, "id": location_data['id']})
 
@@ -135,40 +165,27 @@ def handle_locations():
 @alice_bp.route('/api/quests', methods=['GET', 'POST'])
 def handle_quests():
     if request.method == 'GET':
-        # Get all quests
-        if os.path.exists(QUESTS_FILE):
-            with open(QUESTS_FILE, 'r') as f:
-                return jsonify(json.load(f))
-        return jsonify([])
+        # Get all quests, or the changes after ?since=
+        return collection_response(quests_store)
     
     elif request.method == 'POST':
         # Add or update a quest
         quest_data = request.json
         
-        # Load existing quests
-        quests = []
-        if os.path.exists(QUESTS_FILE):
-            with open(QUESTS_FILE, 'r') as f:
-                quests = json.load(f)
-        
         # Add or update quest
         if 'id' in quest_data:
             # Update existing quest
-            for i, quest in enumerate(quests):
-                if quest['id'] == quest_data['id']:
-                    quest_data['modified'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                    quests[i] = quest_data
-                    break
+            if quests_store.get(quest_data['id']) is not None:
+                quest_data['modified'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                quests_store.put(quest_data)
+                changes.publish('quests', 'upsert', quest_data)
         else:
             # Create new quest
             quest_data['id'] = str(uuid.uuid4())
             quest_data['created'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             quest_data['modified'] = quest_data['created']
-            quests.append(quest_data)
-        
-        # Save quests back to file
-        with open(QUESTS_FILE, 'w') as f:
-            json.dump(quests, f, indent=2)
+            quests_store.put(quest_data)
+            changes.publish('quests', 'upsert', quest_data)
         
         return jsonify({"success": True, "id": quest_data['id']})
 
@@ -176,40 +193,27 @@ def handle_quests():
 @alice_bp.route('/api/dialogues', methods=['GET', 'POST'])
 def handle_dialogues():
     if request.method == 'GET':
-        # Get all dialogues
-        if os.path.exists(DIALOGUES_FILE):
-            with open(DIALOGUES_FILE, 'r') as f:
-                return jsonify(json.load(f))
-        return jsonify([])
+        # Get all dialogues, or the changes after ?since=
+        return collection_response(dialogues_store)
     
     elif request.method == 'POST':
         # Add or update a dialogue
         dialogue_data = request.json
         
-        # Load existing dialogues
-        dialogues = []
-        if os.path.exists(DIALOGUES_FILE):
-            with open(DIALOGUES_FILE, 'r') as f:
-                dialogues = json.load(f)
-        
         # Add or update dialogue
         if 'id' in dialogue_data:
             # Update existing dialogue
-            for i, dialogue in enumerate(dialogues):
-                if dialogue['id'] == dialogue_data['id']:
-                    dialogue_data['modified'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                    dialogues[i] = dialogue_data
-                    break
+            if dialogues_store.get(dialogue_data['id']) is not None:
+                dialogue_data['modified'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                dialogues_store.put(dialogue_data)
+                changes.publish('dialogues', 'upsert', dialogue_data)
         else:
             # Create new dialogue
             dialogue_data['id'] = str(uuid.uuid4())
             dialogue_data['created'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             dialogue_data['modified'] = dialogue_data['created']
-            dialogues.append(dialogue_data)
-        
-        # Save dialogues back to file
-        with open(DIALOGUES_FILE, 'w') as f:
-            json.dump(dialogues, f, indent=2)
+            dialogues_store.put(dialogue_data)
+            changes.publish('dialogues', 'upsert', dialogue_data)
         
         return jsonify({"success": True, "id": dialogue_data['id']})
 
@@ -217,40 +221,27 @@ def handle_dialogues():
 @alice_bp.route('/api/story-arcs', methods=['GET', 'POST'])
 def handle_story_arcs():
     if request.method == 'GET':
-        # Get all story arcs
-        if os.path.exists(STORY_ARCS_FILE):
-            with open(STORY_ARCS_FILE, 'r') as f:
-                return jsonify(json.load(f))
-        return jsonify([])
+        # Get all story arcs, or the changes after ?since=
+        return collection_response(story_arcs_store)
     
     elif request.method == 'POST':
         # Add or update a story arc
         story_arc_data = request.json
         
-        # Load existing story arcs
-        story_arcs = []
-        if os.path.exists(STORY_ARCS_FILE):
-            with open(STORY_ARCS_FILE, 'r') as f:
-                story_arcs = json.load(f)
-        
         # Add or update story arc
         if 'id' in story_arc_data:
             # Update existing story arc
-            for i, story_arc in enumerate(story_arcs):
-                if story_arc['id'] == story_arc_data['id']:
-                    story_arc_data['modified'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                    story_arcs[i] = story_arc_data
-                    break
+            if story_arcs_store.get(story_arc_data['id']) is not None:
+                story_arc_data['modified'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                story_arcs_store.put(story_arc_data)
+                changes.publish('story_arcs', 'upsert', story_arc_data)
         else:
             # Create new story arc
             story_arc_data['id'] = str(uuid.uuid4())
             story_arc_data['created'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             story_arc_data['modified'] = story_arc_data['created']
-            story_arcs.append(story_arc_data)
-        
-        # Save story arcs back to file
-        with open(STORY_ARCS_FILE, 'w') as f:
-            json.dump(story_arcs, f, indent=2)
+            story_arcs_store.put(story_arc_data)
+            changes.publish('story_arcs', 'upsert', story_arc_data)
         
         return jsonify({"success": True, "id": story_arc_data['id']})
 
@@ -260,19 +251,8 @@ def export_dialogue(dialogue_id):
     """
     Export a dialogue to a format suitable for the game engine
     """
-    # Load dialogues
-    if not os.path.exists(DIALOGUES_FILE):
-        return jsonify({"success": False, "error": "Dialogues file not found"}), 404
-    
-    with open(DIALOGUES_FILE, 'r') as f:
-        dialogues = json.load(f)
-    
     # Find the requested dialogue
-    dialogue = None
-    for d in dialogues:
-        if d['id'] == dialogue_id:
-            dialogue = d
-            break
+    dialogue = dialogues_store.get(dialogue_id)
     
     if not dialogue:
         return jsonify({"success": False, "error": "Dialogue not found"}), 404
@@ -304,11 +284,7 @@ def generate_character_relationships():
     """
     Generate a visual graph representation of character relationships
     """
-    if not os.path.exists(CHARACTERS_FILE):
-        return jsonify({"success": False, "error": "Characters file not found"}), 404
-    
-    with open(CHARACTERS_FILE, 'r') as f:
-        characters = json.load(f)
+    characters = characters_store.all()
     
     # Generate nodes and edges for the relationship graph
     nodes = []
@@ -361,57 +337,42 @@ def search_story_elements():
     }
     
     # Search in characters
-    if os.path.exists(CHARACTERS_FILE):
-        with open(CHARACTERS_FILE, 'r') as f:
-            characters = json.load(f)
-            for character in characters:
-                if (query in character.get('name', '').lower() or 
-                    query in character.get('description', '').lower() or
-                    query in character.get('background', '').lower()):
-                    results["characters"].append(character)
+    for character in characters_store.all():
+        if (query in character.get('name', '').lower() or 
+            query in character.get('description', '').lower() or
+            query in character.get('background', '').lower()):
+            results["characters"].append(character)
     
     # Search in locations
-    if os.path.exists(LOCATIONS_FILE):
-        with open(LOCATIONS_FILE, 'r') as f:
-            locations = json.load(f)
-            for location in locations:
-                if (query in location.get('name', '').lower() or 
-                    query in location.get('description', '').lower()):
-                    results["locations"].append(location)
+    for location in locations_store.all():
+        if (query in location.get('name', '').lower() or 
+            query in location.get('description', '').lower()):
+            results["locations"].append(location)
     
     # Search in quests
-    if os.path.exists(QUESTS_FILE):
-        with open(QUESTS_FILE, 'r') as f:
-            quests = json.load(f)
-            for quest in quests:
-                if (query in quest.get('title', '').lower() or 
-                    query in quest.get('description', '').lower()):
-                    results["quests"].append(quest)
+    for quest in quests_store.all():
+        if (query in quest.get('title', '').lower() or 
+            query in quest.get('description', '').lower()):
+            results["quests"].append(quest)
     
     # Search in dialogues
-    if os.path.exists(DIALOGUES_FILE):
-        with open(DIALOGUES_FILE, 'r') as f:
-            dialogues = json.load(f)
-            for dialogue in dialogues:
-                if (query in dialogue.get('title', '').lower()):
-                    # Also search in dialogue nodes
-                    if 'nodes' in dialogue:
-                        for node in dialogue['nodes']:
-                            if (query in node.get('text', '').lower()):
-                                if dialogue not in results["dialogues"]:
-                                    results["dialogues"].append(dialogue)
-                                break
-                    else:
-                        results["dialogues"].append(dialogue)
+    for dialogue in dialogues_store.all():
+        if (query in dialogue.get('title', '').lower()):
+            # Also search in dialogue nodes
+            if 'nodes' in dialogue:
+                for node in dialogue['nodes']:
+                    if (query in node.get('text', '').lower()):
+                        if dialogue not in results["dialogues"]:
+                            results["dialogues"].append(dialogue)
+                        break
+            else:
+                results["dialogues"].append(dialogue)
     
     # Search in story arcs
-    if os.path.exists(STORY_ARCS_FILE):
-        with open(STORY_ARCS_FILE, 'r') as f:
-            story_arcs = json.load(f)
-            for arc in story_arcs:
-                if (query in arc.get('title', '').lower() or 
-                    query in arc.get('description', '').lower()):
-                    results["storyArcs"].append(arc)
+    for arc in story_arcs_store.all():
+        if (query in arc.get('title', '').lower() or 
+            query in arc.get('description', '').lower()):
+            results["storyArcs"].append(arc)
     
     return jsonify({
         "success": True,
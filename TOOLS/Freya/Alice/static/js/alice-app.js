@@ -11,6 +11,7 @@ document.addEventListener('DOMContentLoaded', () => {
         dialogues: [],
         quests: [],
         storyArcs: [],
+        rev: null,
         activeSection: 'story-dashboard'
     };
 
@@ -41,6 +42,13 @@ document.addEventListener('DOMContentLoaded', () => {
         
         // Load initial data
         loadData();
+
+        // Catch up on changes made elsewhere when the tab is shown again
+        document.addEventListener('visibilitychange', () => {
+            if (document.visibilityState === 'visible') {
+                syncData();
+            }
+        });
     }
 
     // Navigation between sections
@@ -148,25 +156,15 @@ document.addEventListener('DOMContentLoaded', () => {
     // Load data from API
     async function loadData() {
         try {
-            // Load characters
-            const charactersResponse = await fetch('/alice/api/characters');
-            state.characters = await charactersResponse.json();
-
-            // Load locations
-            const locationsResponse = await fetch('/alice/api/locations');
-            state.locations = await locationsResponse.json();
-
-            // Load dialogues
-            const dialoguesResponse = await fetch('/alice/api/dialogues');
-            state.dialogues = await dialoguesResponse.json();
-
-            // Load quests
-            const questsResponse = await fetch('/alice/api/quests');
-            state.quests = await questsResponse.json();
-
-            // Load story arcs
-            const storyArcsResponse = await fetch('/alice/api/story-arcs');
-            state.storyArcs = await storyArcsResponse.json();
+            // Load every collection in one round trip
+            const response = await fetch('/alice/api/bootstrap');
+            const { rev, collections } = await response.json();
+            state.rev = rev;
+            state.characters = collections.characters.items;
+            state.locations = collections.locations.items;
+            state.dialogues = collections.dialogues.items;
+            state.quests = collections.quests.items;
+            state.storyArcs = collections.story_arcs.items;
 
             // Update dashboard with loaded data
             updateDashboard();
@@ -179,6 +177,43 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
+    // Apply only the records changed since the last load, or reload if the server can't tell
+    async function syncData() {
+        if (!state.rev) return;
+        try {
+            const response = await fetch(`/alice/api/bootstrap?since=${encodeURIComponent(state.rev)}`);
+            const delta = await response.json();
+            if (delta.resync) {
+                loadData();
+                return;
+            }
+
+            const stateKeys = {
+                characters: 'characters',
+                locations: 'locations',
+                dialogues: 'dialogues',
+                quests: 'quests',
+                story_arcs: 'storyArcs'
+            };
+            let changed = false;
+            Object.entries(delta.collections).forEach(([name, changes]) => {
+                if (changes.upserts.length === 0 && changes.deleted.length === 0) return;
+                const replaced = new Set(changes.deleted.concat(changes.upserts.map(record => record.id)));
+                const key = stateKeys[name];
+                state[key] = state[key].filter(item => !replaced.has(item.id)).concat(changes.upserts);
+                changed = true;
+            });
+            state.rev = delta.rev;
+
+            if (changed) {
+                updateDashboard();
+                initRelationshipGraph();
+            }
+        } catch (error) {
+            console.error('Error syncing data:', error);
+        }
+    }
+
     // Update dashboard with current data
     function updateDashboard() {
         // Update characters list
@@ -0,0 +1,158 @@
+"""
+Freya - API response layer
+Fast JSON encoding, negotiated gzip/zstd compression and per-route timings for JSON responses
+"""
+
+import gzip
+import time
+import threading
+
+from flask import g, has_request_context, request
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    from flask.json.provider import DefaultJSONProvider
+except ImportError:
+    # Flask < 2.2 has no pluggable provider; jsonify keeps the stdlib encoder
+    # there and serialization is not timed
+    DefaultJSONProvider = None
+
+COMPRESSIBLE_MIMETYPES = {'application/json'}
+
+if DefaultJSONProvider is not None:
+    class FastJSONProvider(DefaultJSONProvider):
+        """jsonify through orjson when it is installed, stdlib json otherwise.
+
+        Output is always compact. Anything orjson cannot encode natively goes
+        through Flask's usual default() hook, and anything it rejects
+        outright (e.g. integers over 64 bits) falls back to the stdlib.
+        """
+
+        compact = True
+
+        def dumps(self, obj, **kwargs):
+            start = time.perf_counter()
+            try:
+                if orjson is not None and set(kwargs) <= {'separators'}:
+                    options = (orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+                               | orjson.OPT_PASSTHROUGH_DATACLASS)
+                    if self.sort_keys:
+                        options |= orjson.OPT_SORT_KEYS
+                    try:
+                        return orjson.dumps(obj, default=self.default, option=options).decode('utf-8')
+                    except TypeError:
+                        pass
+                return super().dumps(obj, **kwargs)
+            finally:
+                if has_request_context():
+                    g.json_seconds = g.get('json_seconds', 0.0) + time.perf_counter() - start
+
+class ApiResponses:
+    """Installs the JSON provider and compresses JSON responses above min_size.
+
+    zstd is preferred when the client accepts it and the zstandard package
+    is installed, then gzip. A strong ETag on a compressed response is made
+    weak, since the bytes differ per encoding. Serialization and compression
+    time are added to a Server-Timing header and totalled per endpoint for
+    stats(); serialization only where it was actually measured.
+    """
+
+    def __init__(self, app=None, min_size=1024, gzip_level=6, zstd_level=3):
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.zstd_level = zstd_level
+        self._lock = threading.Lock()
+        self._routes = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if DefaultJSONProvider is not None:
+            app.json_provider_class = FastJSONProvider
+            app.json = FastJSONProvider(app)
+        app.after_request(self._after_request)
+
+    def _choose_encoding(self):
+        accepted = request.accept_encodings
+        if zstandard is not None and accepted['zstd']:
+            return 'zstd'
+        if accepted['gzip']:
+            return 'gzip'
+        return None
+
+    def _compress(self, data, encoding):
+        if encoding == 'zstd':
+            return zstandard.ZstdCompressor(level=self.zstd_level).compress(data)
+        return gzip.compress(data, compresslevel=self.gzip_level)
+
+    def _after_request(self, response):
+        if response.mimetype not in COMPRESSIBLE_MIMETYPES or response.is_streamed or response.direct_passthrough:
+            return response
+
+        json_seconds = g.get('json_seconds')
+        compress_seconds = 0.0
+        size = response.content_length or 0
+        sent = size
+
+        if 200 <= response.status_code < 300 and 'Content-Encoding' not in response.headers:
+            response.vary.add('Accept-Encoding')
+            encoding = self._choose_encoding() if size >= self.min_size else None
+            if encoding:
+                start = time.perf_counter()
+                body = self._compress(response.get_data(), encoding)
+                compress_seconds = time.perf_counter() - start
+                response.set_data(body)
+                response.headers['Content-Encoding'] = encoding
+                sent = len(body)
+                etag, weak = response.get_etag()
+                if etag and not weak:
+                    response.set_etag(etag, weak=True)
+
+        timings = []
+        if json_seconds is not None:
+            timings.append(f"json;dur={json_seconds * 1000:.2f}")
+        if compress_seconds:
+            timings.append(f"compress;dur={compress_seconds * 1000:.2f}")
+        if timings:
+            response.headers.add('Server-Timing', ', '.join(timings))
+        self._record(request.endpoint or 'unknown', json_seconds, compress_seconds, size, sent)
+        return response
+
+    def _record(self, endpoint, json_seconds, compress_seconds, size, sent):
+        with self._lock:
+            route = self._routes.setdefault(endpoint, {
+                "requests": 0, "json_timed": 0, "json_ms": 0.0, "compress_ms": 0.0, "bytes": 0, "bytes_sent": 0
+            })
+            route["requests"] += 1
+            if json_seconds is not None:
+                route["json_timed"] += 1
+                route["json_ms"] += json_seconds * 1000
+            route["compress_ms"] += compress_seconds * 1000
+            route["bytes"] += size
+            route["bytes_sent"] += sent
+
+    def stats(self):
+        with self._lock:
+            routes = {}
+            for endpoint, route in self._routes.items():
+                count = route["requests"]
+                routes[endpoint] = dict(route,
+                                        json_ms=round(route["json_ms"], 3),
+                                        compress_ms=round(route["compress_ms"], 3),
+                                        avg_json_ms=(round(route["json_ms"] / route["json_timed"], 3)
+                                                     if route["json_timed"] else None),
+                                        avg_compress_ms=round(route["compress_ms"] / count, 3))
+            return {
+                "json_encoder": "orjson" if orjson is not None and DefaultJSONProvider is not None else "json",
+                "encodings": (["zstd"] if zstandard is not None else []) + ["gzip"],
+                "routes": routes
+            }
@@ -3,20 +3,17 @@ Freya - Game Development Documentation Tool
 Main application file
 """
 
+import io
 import os
 import json
-import markdown
 import re
 import uuid
 import shutil
+import atexit
 from datetime import datetime
-import pandas as pd
 import plotly
-from flask import Flask, render_template, jsonify, request, send_from_directory, url_for, redirect, flash, session
+from flask import Flask, Response, render_template, jsonify, request, send_file, url_for, redirect, flash, session
 from werkzeug.utils import secure_filename
-from pymdownx.superfences import SuperFencesExtension
-from pymdownx.emoji import EmojiExtension
-import subprocess
 import logging
 from dotenv import load_dotenv
 from werkzeug.middleware.dispatcher import DispatcherMiddleware
@@ -24,6 +21,19 @@ from flask_wtf.csrf import CSRFProtect
 
 # Import Alice blueprint
 from Alice.routes import alice_bp
+from api_response import ApiResponses
+from blob_store import BlobStore, count_references
+from change_stream import ChangeStream
+from diagram_renderer import DiagramRenderer, RenderError
+from doc_patch import PatchError, VersionConflict, content_version, patch_file, path_lock, write_atomic
+from docs_tree import DocsTree
+from downsample import DOWNSAMPLE_METHODS, downsample, encode_typed_array, numeric_array
+from image_variants import VariantCache, VARIANT_FORMATS
+from jobs import JobQueue, QueueFull, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW
+from render_cache import RenderCache, split_sections, section_hash
+from static_assets import StaticAssets
+from stores import open_store, read_collections
+from task_metrics import TaskMetrics
 
 # Load environment variables
 load_dotenv()
@@ -33,10 +43,13 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Initialize the main app
-app = Flask(__name__)
+app = Flask(__name__, static_folder=None)
 app.secret_key = os.environ.get('SECRET_KEY', 'freya-alice-development-key')
 csrf = CSRFProtect(app)
 
+# Fast JSON encoding and gzip/zstd for JSON responses of at least API_COMPRESS_MIN_BYTES
+api_responses = ApiResponses(app, min_size=int(os.environ.get('API_COMPRESS_MIN_BYTES', 1024)))
+
 # Register Alice blueprint
 app.register_blueprint(alice_bp, url_prefix='/alice')
 
@@ -46,13 +59,49 @@ BASE_DOCS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__
 # Path for uploads
 UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
 IMAGE_FOLDER = os.path.join(UPLOAD_FOLDER, 'images')
+BLOB_FOLDER = os.path.join(IMAGE_FOLDER, 'blobs')
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'svg'}
+# Uploads land in the blob store before their job records them, so GC never
+# touches blobs younger than this, whatever min_age a request asks for
+IMAGE_GC_MIN_AGE = 3600
+
+# Static files and uploads with content-hash ETags and precompressed variants.
+# Blobs are content-addressed, so they can be cached for good under their own name.
+ASSET_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'assets')
+static_assets = StaticAssets(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static'), ASSET_CACHE_PATH)
+upload_assets = StaticAssets(UPLOAD_FOLDER, ASSET_CACHE_PATH, immutable_prefixes=('images/blobs/',))
+
+# Live change feed for connected clients, see /api/events. Its bounded history
+# also serves ?since= delta requests on the collection endpoints.
+changes = ChangeStream(history_size=int(os.environ.get('CHANGE_LOG_SIZE', 1000)))
+
+# Mermaid rendering. MERMAID_WORKER is a long-lived renderer command such as
+# "node mermaid_worker.mjs"; without it each diagram is a one-shot mmdc call.
+DIAGRAM_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'diagrams')
+diagram_renderer = DiagramRenderer(DIAGRAM_CACHE_PATH,
+                                   worker_command=os.environ.get('MERMAID_WORKER'),
+                                   workers=int(os.environ.get('MERMAID_WORKERS', 2)),
+                                   cli=os.environ.get('MERMAID_CLI', 'mmdc'))
+atexit.register(diagram_renderer.close)
+
+# Uploaded images and rendered diagrams, stored once per unique content
+blob_store = BlobStore(BLOB_FOLDER)
+
+# Resized/re-encoded copies of images, see /api/images/<id>/variant
+VARIANT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'variants')
+image_variants = VariantCache(VARIANT_CACHE_PATH,
+                              max_bytes=int(os.environ.get('IMAGE_VARIANT_CACHE_BYTES', 256 * 1024 * 1024)),
+                              workers=int(os.environ.get('IMAGE_VARIANT_WORKERS', 2)))
+
+# Slow work (diagram renders, image saves) runs here and is polled via /api/jobs/<id>
+jobs = JobQueue(workers=int(os.environ.get('JOB_WORKERS', 2)),
+                max_pending=int(os.environ.get('JOB_MAX_PENDING', 100)))
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max upload
 
 # Create necessary directories if they don't exist
-for path in [BASE_DOCS_PATH, UPLOAD_FOLDER, IMAGE_FOLDER]:
+for path in [BASE_DOCS_PATH, UPLOAD_FOLDER, IMAGE_FOLDER, BLOB_FOLDER]:
     if not os.path.exists(path):
         os.makedirs(path)
     
@@ -62,6 +111,10 @@ for subdir in ['PRD', 'Development', 'Ideas', 'Player', 'Story']:
     if not os.path.exists(dir_path):
         os.makedirs(dir_path)
 
+# Titles and summaries of the docs, kept up to date by stat
+DOCS_TREE_AREAS = ['PRD', 'Development', 'Player', 'Story', 'Assets']
+docs_tree = DocsTree(BASE_DOCS_PATH, DOCS_TREE_AREAS)
+
 # Data paths
 DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
 if not os.path.exists(DATA_PATH):
@@ -85,21 +138,75 @@ for file_path, default_data in data_files.items():
         with open(file_path, 'w') as f:
             json.dump(default_data, f)
 
+# Collections live in SQLite by default (STORAGE_BACKEND=json keeps the JSON files).
+# The SQLite backend imports the JSON files the first time it opens them.
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'sqlite')
+DATABASE_FILE = os.path.join(DATA_PATH, 'freya.db')
+
+ideas_store = open_store('ideas', IDEAS_FILE, STORAGE_BACKEND, DATABASE_FILE)
+tasks_store = open_store('tasks', TASKS_FILE, STORAGE_BACKEND, DATABASE_FILE)
+images_store = open_store('images', IMAGES_FILE, STORAGE_BACKEND, DATABASE_FILE)
+diagrams_store = open_store('diagrams', DIAGRAMS_FILE, STORAGE_BACKEND, DATABASE_FILE)
+
+# Dashboard aggregates, updated alongside every task write
+task_metrics = TaskMetrics(tasks_store)
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+MARKDOWN_EXTENSIONS = [
+    'tables', 
+    'fenced_code', 
+    'nl2br',
+    'pymdownx.superfences',
+    'pymdownx.emoji',
+    'pymdownx.tasklist',
+    'pymdownx.highlight'
+]
+
+# Rendered HTML is cached by content hash, bounded by RENDER_CACHE_BYTES
+render_cache = RenderCache(int(os.environ.get('RENDER_CACHE_BYTES', 32 * 1024 * 1024)))
+
 # Helper function to render markdown with extended features
 def render_markdown(content):
-    extensions = [
-        'tables', 
-        'fenced_code', 
-        'nl2br',
-        'pymdownx.superfences',
-        'pymdownx.emoji',
-        'pymdownx.tasklist',
-        'pymdownx.highlight'
-    ]
-    return markdown.markdown(content, extensions=extensions)
+    return render_cache.render(content, MARKDOWN_EXTENSIONS)
+
+def not_modified(etag):
+    """Return a 304 response if the client already holds this version, else None"""
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag, weak=True)
+        response.cache_control.no_cache = True
+        return response
+    return None
+
+def json_with_etag(data, etag):
+    response = jsonify(data)
+    response.set_etag(etag, weak=True)
+    response.cache_control.no_cache = True
+    return response
+
+def collection_response(store):
+    """GET for a collection: every record, or only what changed after ?since=<rev>.
+
+    Full responses carry the cursor to pass as since next time in
+    X-Change-Rev, taken before the read so no later write can be missed.
+    A since that the change log no longer reaches back to gets
+    {"resync": true} and the client should fetch the collection in full.
+    """
+    if 'since' in request.args:
+        delta = changes.delta(request.args['since'], [store.name])
+        if delta is None:
+            return jsonify({"success": True, "resync": True, "rev": changes.cursor()})
+        return jsonify(dict(delta["collections"][store.name], success=True, resync=False, rev=delta["rev"]))
+    
+    rev = changes.cursor()
+    response = not_modified(store.version())
+    if response is None:
+        version, items = store.snapshot()
+        response = json_with_etag(items, version)
+    response.headers['X-Change-Rev'] = rev
+    return response
 
 # Routes
 @app.route('/')
@@ -108,11 +215,59 @@ def index():
 
 @app.route('/static/<path:path>')
 def send_static(path):
-    return send_from_directory('static', path)
+    return static_assets.send(path)
 
 @app.route('/uploads/<path:path>')
 def send_upload(path):
-    return send_from_directory('uploads', path)
+    return upload_assets.send(path)
+
+@app.context_processor
+def asset_helpers():
+    return {"asset_url": lambda path: url_for('send_static', path=static_assets.asset_url(path))}
+
+def job_accepted(job):
+    """202 response pointing the client at the job's status URL"""
+    status_url = url_for('get_job', job_id=job.id)
+    response = jsonify({"success": True, "job": job.to_dict(), "status_url": status_url})
+    response.headers['Location'] = status_url
+    return response, 202
+
+def queue_full(e):
+    logger.warning(f"Job queue full: {str(e)}")
+    response = jsonify({"success": False, "error": "Server is busy, try again shortly"})
+    response.headers['Retry-After'] = '5'
+    return response, 503
+
+def save_blob(stream, ext):
+    """Store a stream in the blob store; returns the image record fields that point at it"""
+    blob = blob_store.write(stream, ext)
+    filename = f"blobs/{blob['relpath']}"
+    return {
+        'filename': filename,
+        'path': f"uploads/images/{filename}",
+        'url': f"/uploads/images/{filename}",
+        'digest': blob['digest'],
+        'size': blob['size']
+    }
+
+def save_image(job, image_data):
+    """Job: register an image already written to the blob store and prepare its thumbnail"""
+    job.update(message="Saving image")
+    if not image_data['filename'].lower().endswith('.svg'):
+        image_data['thumbnail_url'] = f"/api/images/{image_data['id']}/variant?width=320&format=webp"
+    
+    # Save to images registry
+    images_store.put(image_data)
+    changes.publish('images', 'upsert', image_data)
+    
+    if 'thumbnail_url' in image_data:
+        job.update(progress=0.5, message="Rendering thumbnail")
+        try:
+            image_variants.get(os.path.join(IMAGE_FOLDER, image_data['filename']), image_data['digest'], 320, 'webp')
+        except Exception as e:
+            # The variant endpoint renders it on first request instead
+            logger.warning(f"Could not pre-render thumbnail for {image_data['id']}: {str(e)}")
+    return {"image": image_data}
 
 # Image Upload Route
 @app.route('/api/upload/image', methods=['POST'])
@@ -127,50 +282,145 @@ def upload_image():
     
     if file and allowed_file(file.filename):
         filename = secure_filename(file.filename)
-        # Add unique identifier to avoid name collisions
-        base, ext = os.path.splitext(filename)
-        unique_filename = f"{base}_{uuid.uuid4().hex[:8]}{ext}"
         
-        file_path = os.path.join(IMAGE_FOLDER, unique_filename)
-        file.save(file_path)
-        
-        # Record the image metadata
+        # Record the image metadata; the file location is filled in once it is stored
         image_data = {
             'id': str(uuid.uuid4()),
-            'filename': unique_filename,
             'original_name': filename,
-            'path': f"uploads/images/{unique_filename}",
-            'url': f"/uploads/images/{unique_filename}",
             'created': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
             'description': request.form.get('description', ''),
             'tags': request.form.get('tags', '').split(',') if request.form.get('tags') else []
         }
         
-        # Save to images registry
-        images = []
-        if os.path.exists(IMAGES_FILE):
-            with open(IMAGES_FILE, 'r') as f:
-                images = json.load(f)
-        
-        images.append(image_data)
-        
-        with open(IMAGES_FILE, 'w') as f:
-            json.dump(images, f, indent=2)
-        
-        return jsonify({
-            "success": True, 
-            "image": image_data
-        })
+        # Hash the upload while copying it into the blob store, so queued jobs
+        # hold only the record; a blob left behind by a full queue is collected by gc
+        image_data.update(save_blob(file.stream, os.path.splitext(filename)[1]))
+        try:
+            job = jobs.submit('image', save_image, image_data, priority=PRIORITY_HIGH)
+        except QueueFull as e:
+            return queue_full(e)
+        return job_accepted(job)
     
     return jsonify({"success": False, "error": "File type not allowed"}), 400
 
+def image_reference_texts():
+    """Everything that may refer to a blob: image and diagram records, and the docs"""
+    for store in (images_store, diagrams_store):
+        for record in store.all():
+            yield json.dumps(record)
+    for root, dirs, files in os.walk(BASE_DOCS_PATH):
+        for file in files:
+            if file.endswith('.md'):
+                with open(os.path.join(root, file), 'r', encoding='utf-8', errors='replace') as f:
+                    yield f.read()
+
+def collect_image_garbage(job, dry_run=False, min_age=IMAGE_GC_MIN_AGE):
+    """Job: delete blobs that no record or document refers to"""
+    job.update(0.1, "Counting references")
+    references = count_references(image_reference_texts())
+    job.update(0.5, "Removing unreferenced blobs")
+    result = blob_store.gc(references, min_age=min_age, dry_run=dry_run)
+    logger.info(f"Image GC removed {len(result['removed'])} blobs, freed {result['bytes_freed']} bytes"
+                f"{' (dry run)' if dry_run else ''}")
+    return result
+
+# Remove unreferenced image blobs
+@app.route('/api/images/gc', methods=['POST'])
+def image_gc():
+    data = request.get_json(silent=True) or {}
+    try:
+        min_age = max(int(data.get('min_age', IMAGE_GC_MIN_AGE)), IMAGE_GC_MIN_AGE)
+    except (TypeError, ValueError):
+        return jsonify({"success": False, "error": "min_age must be a number of seconds"}), 400
+    try:
+        job = jobs.submit('image-gc', collect_image_garbage,
+                          dry_run=bool(data.get('dry_run', False)),
+                          min_age=min_age,
+                          priority=PRIORITY_LOW)
+    except QueueFull as e:
+        return queue_full(e)
+    return job_accepted(job)
+
 # Get all images
 @app.route('/api/images', methods=['GET'])
 def get_images():
-    if os.path.exists(IMAGES_FILE):
-        with open(IMAGES_FILE, 'r') as f:
-            return jsonify(json.load(f))
-    return jsonify([])
+    return collection_response(images_store)
+
+# Resized/re-encoded image, e.g. ?width=320&format=webp&quality=80
+@app.route('/api/images/<image_id>/variant', methods=['GET'])
+def get_image_variant(image_id):
+    image = images_store.get(image_id)
+    if image is None:
+        return jsonify({"success": False, "error": "Image not found"}), 404
+    
+    try:
+        width = int(request.args.get('width', 320))
+        quality = int(request.args.get('quality', 80))
+    except ValueError:
+        return jsonify({"success": False, "error": "width and quality must be integers"}), 400
+    fmt = request.args.get('format', 'webp').lower()
+    if fmt not in VARIANT_FORMATS or not 1 <= width <= 10000 or not 1 <= quality <= 100:
+        return jsonify({"success": False, "error": "Unsupported width, format or quality"}), 400
+    
+    # Vector images are already small and scale on their own
+    if image['filename'].lower().endswith('.svg'):
+        return redirect(image['url'])
+    
+    source_path = os.path.join(IMAGE_FOLDER, image['filename'])
+    if not os.path.exists(source_path):
+        return jsonify({"success": False, "error": "Image file not found"}), 404
+    
+    # Blobs never change; older uploads are identified by their file stats instead
+    source_key = image.get('digest')
+    if not source_key:
+        stat = os.stat(source_path)
+        source_key = f"{image['filename']}:{stat.st_mtime_ns}:{stat.st_size}"
+    
+    try:
+        path, mimetype, key = image_variants.get(source_path, source_key, width, fmt, quality)
+    except Exception as e:
+        logger.error(f"Error generating image variant: {str(e)}")
+        return jsonify({"success": False, "error": "Could not generate image variant"}), 500
+    
+    # The URL fully determines the bytes, so browsers may keep them for good
+    if request.if_none_match.contains(key):
+        response = app.response_class(status=304)
+    else:
+        response = send_file(path, mimetype=mimetype, conditional=False)
+    response.set_etag(key)
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+def save_diagram(svg, diagram_code, name, data):
+    """Store a rendered diagram by content hash and register it"""
+    # Record the diagram metadata
+    diagram_data = {
+        'id': str(uuid.uuid4()),
+        'name': name,
+        **save_blob(io.BytesIO(svg.encode('utf-8')), '.svg'),
+        'code': diagram_code,
+        'created': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'modified': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'type': data.get('type', 'flowchart'),
+        'tags': data.get('tags', [])
+    }
+    
+    # Save to diagrams registry
+    diagrams_store.put(diagram_data)
+    changes.publish('diagrams', 'upsert', diagram_data)
+    return diagram_data
+
+def render_diagram(job, diagram_code, options, name, data):
+    """Job: render a diagram that is not in the SVG cache yet, then save it"""
+    job.update(0.1, "Rendering diagram")
+    try:
+        svg, _ = diagram_renderer.render(diagram_code, options)
+    except RenderError as e:
+        logger.error(f"Mermaid render error: {str(e)}")
+        raise RenderError("Failed to render diagram")
+    
+    job.update(0.9, "Saving diagram")
+    return {"diagram": save_diagram(svg, diagram_code, name, data)}
 
 # Create diagram from Mermaid syntax
 @app.route('/api/diagram/create', methods=['POST'])
@@ -182,117 +432,85 @@ def create_diagram():
     if not diagram_code:
         return jsonify({"success": False, "error": "No diagram code provided"}), 400
     
-    # Create a temporary mermaid file
-    diagram_id = str(uuid.uuid4())
-    temp_file = os.path.join(DATA_PATH, f"temp_diagram_{diagram_id}.mmd")
+    options = {"background": data.get('background', 'transparent')}
+    if data.get('theme'):
+        options["theme"] = data['theme']
     
     try:
-        with open(temp_file, 'w') as f:
-            f.write(diagram_code)
-        
-        # Generate SVG output path
-        output_filename = f"{secure_filename(name)}_{diagram_id[:8]}.svg"
-        output_path = os.path.join(IMAGE_FOLDER, output_filename)
-        
-        # Call mmdc CLI to render the diagram
-        # Note: This requires mermaid-cli to be installed
-        result = subprocess.run(
-            ['mmdc', '-i', temp_file, '-o', output_path, '-b', 'transparent'],
-            capture_output=True,
-            text=True
-        )
-        
-        if result.returncode != 0:
-            logger.error(f"Mermaid CLI error: {result.stderr}")
-            return jsonify({"success": False, "error": "Failed to render diagram"}), 500
-        
-        # Record the diagram metadata
-        diagram_data = {
-            'id': diagram_id,
-            'name': name,
-            'filename': output_filename,
-            'path': f"uploads/images/{output_filename}",
-            'url': f"/uploads/images/{output_filename}",
-            'code': diagram_code,
-            'created': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'modified': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'type': data.get('type', 'flowchart'),
-            'tags': data.get('tags', [])
-        }
-        
-        # Save to diagrams registry
-        diagrams = []
-        if os.path.exists(DIAGRAMS_FILE):
-            with open(DIAGRAMS_FILE, 'r') as f:
-                diagrams = json.load(f)
-        
-        diagrams.append(diagram_data)
-        
-        with open(DIAGRAMS_FILE, 'w') as f:
-            json.dump(diagrams, f, indent=2)
-        
-        # Clean up temp file
-        if os.path.exists(temp_file):
-            os.remove(temp_file)
+        # Identical code and options come straight from the SVG cache
+        svg = diagram_renderer.lookup(diagram_code, options)
+        if svg is not None:
+            return jsonify({
+                "success": True, 
+                "diagram": save_diagram(svg, diagram_code, name, data),
+                "cached": True
+            })
         
-        return jsonify({
-            "success": True, 
-            "diagram": diagram_data
-        })
+        # Anything else is rendered in the background
+        job = jobs.submit('diagram', render_diagram, diagram_code, options, name, data, priority=PRIORITY_NORMAL)
+        return job_accepted(job)
     
+    except QueueFull as e:
+        return queue_full(e)
     except Exception as e:
         logger.error(f"Error creating diagram: {str(e)}")
-        # Clean up
-        if os.path.exists(temp_file):
-            os.remove(temp_file)
         return jsonify({"success": False, "error": str(e)}), 500
 
 # Get all diagrams
 @app.route('/api/diagrams', methods=['GET'])
 def get_diagrams():
-    if os.path.exists(DIAGRAMS_FILE):
-        with open(DIAGRAMS_FILE, 'r') as f:
-            return jsonify(json.load(f))
-    return jsonify([])
+    return collection_response(diagrams_store)
+
+# Every collection in one response for the first load, each with its version
+BOOTSTRAP_STORES = [ideas_store, tasks_store, images_store, diagrams_store]
+
+@app.route('/api/bootstrap', methods=['GET'])
+def bootstrap():
+    if 'since' in request.args:
+        delta = changes.delta(request.args['since'], [store.name for store in BOOTSTRAP_STORES])
+        if delta is None:
+            return jsonify({"success": True, "resync": True, "rev": changes.cursor()})
+        return jsonify(dict(delta, success=True, resync=False))
+    
+    rev = changes.cursor()
+    etag = '.'.join(store.version() for store in BOOTSTRAP_STORES)
+    cached = not_modified(etag)
+    if cached:
+        cached.headers['X-Change-Rev'] = rev
+        return cached
+    
+    snapshots = read_collections(BOOTSTRAP_STORES)
+    collections = {name: {"version": version, "items": items} for name, (version, items) in snapshots.items()}
+    etag = '.'.join(version for version, _ in snapshots.values())
+    response = json_with_etag({"success": True, "rev": rev, "collections": collections}, etag)
+    response.headers['X-Change-Rev'] = rev
+    return response
 
 # API Routes for Ideas
 @app.route('/api/ideas', methods=['GET', 'POST'])
 def handle_ideas():
     if request.method == 'GET':
-        # Get all ideas
-        if os.path.exists(IDEAS_FILE):
-            with open(IDEAS_FILE, 'r') as f:
-                return jsonify(json.load(f))
-        return jsonify([])
+        # Get all ideas, a 304 if the client's copy is current, or the changes after ?since=
+        return collection_response(ideas_store)
     
     elif request.method == 'POST':
         # Add a new idea
         idea_data = request.json
         
-        # Load existing ideas
-        ideas = []
-        if os.path.exists(IDEAS_FILE):
-            with open(IDEAS_FILE, 'r') as f:
-                ideas = json.load(f)
-        
         # Add new idea with ID and timestamp
         if 'id' in idea_data:
             # Update existing idea
-            for i, idea in enumerate(ideas):
-                if idea['id'] == idea_data['id']:
-                    idea_data['modified'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                    ideas[i] = idea_data
-                    break
+            if ideas_store.get(idea_data['id']) is not None:
+                idea_data['modified'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                ideas_store.put(idea_data)
+                changes.publish('ideas', 'upsert', idea_data)
         else:
             # Create new idea
             idea_data['id'] = str(uuid.uuid4())
             idea_data['created'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             idea_data['modified'] = idea_data['created']
-            ideas.append(idea_data)
-        
-        # Save ideas back to file
-        with open(IDEAS_FILE, 'w') as f:
-            json.dump(ideas, f, indent=2)
+            ideas_store.put(idea_data)
+            changes.publish('ideas', 'upsert', idea_data)
         
         return jsonify({"success": True, "id": idea_data['id']})
 
@@ -300,41 +518,30 @@ def handle_ideas():
 @app.route('/api/tasks', methods=['GET', 'POST'])
 def handle_tasks():
     if request.method == 'GET':
-        # Get all tasks
-        if os.path.exists(TASKS_FILE):
-            with open(TASKS_FILE, 'r') as f:
-                return jsonify(json.load(f))
-        return jsonify([])
+        # Get all tasks, a 304 if the client's copy is current, or the changes after ?since=
+        return collection_response(tasks_store)
     
     elif request.method == 'POST':
         # Add a new task
         task_data = request.json
         
-        # Load existing tasks
-        tasks = []
-        if os.path.exists(TASKS_FILE):
-            with open(TASKS_FILE, 'r') as f:
-                tasks = json.load(f)
-        
         # Add new task with ID and timestamp
         if 'id' in task_data:
             # Update existing task
-            for i, task in enumerate(tasks):
-                if task['id'] == task_data['id']:
-                    task_data['modified'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                    tasks[i] = task_data
-                    break
+            if tasks_store.get(task_data['id']) is not None:
+                task_data['modified'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                tasks_store.put(task_data)
+                task_metrics.update([task_data])
+                changes.publish('tasks', 'upsert', task_data)
         else:
             # Create new task
             task_data['id'] = str(uuid.uuid4())
             task_data['created'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             task_data['modified'] = task_data['created']
             task_data['status'] = task_data.get('status', 'todo')
-            tasks.append(task_data)
-        
-        # Save tasks back to file
-        with open(TASKS_FILE, 'w') as f:
-            json.dump(tasks, f, indent=2)
+            tasks_store.put(task_data)
+            task_metrics.update([task_data])
+            changes.publish('tasks', 'upsert', task_data)
         
         return jsonify({"success": True, "id": task_data['id']})
 
@@ -347,79 +554,68 @@ def update_task_status(task_id):
     if not new_status:
         return jsonify({"success": False, "error": "No status provided"}), 400
     
-    # Load tasks
-    if os.path.exists(TASKS_FILE):
-        with open(TASKS_FILE, 'r') as f:
-            tasks = json.load(f)
-        
-        # Find and update the task
-        for i, task in enumerate(tasks):
-            if task['id'] == task_id:
-                tasks[i]['status'] = new_status
-                tasks[i]['modified'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                
-                # Save tasks back to file
-                with open(TASKS_FILE, 'w') as f:
-                    json.dump(tasks, f, indent=2)
-                
-                return jsonify({"success": True})
-        
-        # Task not found
+    # Find and update the task
+    task = tasks_store.get(task_id)
+    if task is None:
         return jsonify({"success": False, "error": "Task not found"}), 404
     
-    return jsonify({"success": False, "error": "Tasks file not found"}), 404
+    task['status'] = new_status
+    task['modified'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    tasks_store.put(task)
+    task_metrics.update([task])
+    changes.publish('tasks', 'upsert', task)
+    
+    return jsonify({"success": True})
+
+# Update the status of many tasks with a single write
+@app.route('/api/tasks/status', methods=['PUT'])
+def update_task_statuses():
+    data = request.json
+    updates = data.get('updates', []) if isinstance(data, dict) else data
+    if not isinstance(updates, list):
+        return jsonify({"success": False, "error": "Expected a list of updates"}), 400
+    
+    results = []
+    changed = {}
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    for update in updates:
+        task_id = update.get('id') if isinstance(update, dict) else None
+        new_status = update.get('status') if isinstance(update, dict) else None
+        if not task_id or not new_status:
+            results.append({"id": task_id, "success": False, "error": "Each update needs an id and a status"})
+            continue
+        
+        task = changed.get(task_id) or tasks_store.get(task_id)
+        if task is None:
+            results.append({"id": task_id, "success": False, "error": "Task not found"})
+        else:
+            task['status'] = new_status
+            task['modified'] = now
+            changed[task_id] = task
+            results.append({"id": task_id, "success": True})
+    
+    if changed:
+        tasks_store.put_many(list(changed.values()))
+        task_metrics.update(changed.values())
+        for task in changed.values():
+            changes.publish('tasks', 'upsert', task)
+    
+    return jsonify({"success": all(r["success"] for r in results), "results": results})
+
+# Live change feed
+@app.route('/api/events', methods=['GET'])
+def change_events():
+    """Server-Sent Events stream of upserts to ideas, tasks, images and diagrams"""
+    # ?since= gives the first connection a position; reconnects send Last-Event-ID
+    stream = changes.stream(request.headers.get('Last-Event-ID') or request.args.get('since'))
+    return Response(stream, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 # Get task metrics for charts and plots
 @app.route('/api/metrics/tasks', methods=['GET'])
 def get_task_metrics():
     try:
-        if os.path.exists(TASKS_FILE):
-            with open(TASKS_FILE, 'r') as f:
-                tasks = json.load(f)
-            
-            # Create dataframe
-            df = pd.DataFrame(tasks)
-            if len(df) == 0:
-                return jsonify({"success": True, "data": {
-                    "status_counts": {"todo": 0, "in_progress": 0, "completed": 0},
-                    "priority_counts": {"low": 0, "medium": 0, "high": 0},
-                    "timeline_data": []
-                }})
-            
-            # Status counts
-            status_counts = df['status'].value_counts().to_dict()
-            for status in ['todo', 'in_progress', 'completed']:
-                if status not in status_counts:
-                    status_counts[status] = 0
-            
-            # Priority counts if priority exists
-            priority_counts = {}
-            if 'priority' in df.columns:
-                priority_counts = df['priority'].value_counts().to_dict()
-                for priority in ['low', 'medium', 'high']:
-                    if priority not in priority_counts:
-                        priority_counts[priority] = 0
-            
-            # Timeline data - tasks created per day
-            if 'created' in df.columns:
-                df['created_date'] = pd.to_datetime(df['created']).dt.date
-                timeline_data = df.groupby('created_date').size().reset_index()
-                timeline_data.columns = ['date', 'count']
-                timeline_data['date'] = timeline_data['date'].astype(str)
-                timeline_data = timeline_data.to_dict(orient='records')
-            else:
-                timeline_data = []
-            
-            return jsonify({
-                "success": True,
-                "data": {
-                    "status_counts": status_counts,
-                    "priority_counts": priority_counts,
-                    "timeline_data": timeline_data
-                }
-            })
-                
-        return jsonify({"success": False, "error": "Tasks file not found"}), 404
+        return jsonify({"success": True, "data": task_metrics.snapshot()})
     except Exception as e:
         logger.error(f"Error generating task metrics: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 500
@@ -432,51 +628,37 @@ def get_prd_documents():
     if not os.path.exists(prd_path):
         return jsonify({"success": False, "error": "PRD directory not found"}), 404
     
+    # One stat pass; only new or changed files have their first few KB read
+    docs, etag = docs_tree.documents('PRD')
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    
     documents = []
+    for doc in docs:
+        description = doc["summary"]
+        documents.append({
+            "title": doc["title"],
+            "description": description[:100] + "..." if len(description) > 100 else description,
+            "path": doc["path"][len('PRD/'):],
+            "modified": doc["modified"]
+        })
     
-    for root, dirs, files in os.walk(prd_path):
-        # Sort directories and files alphabetically
-        dirs.sort()
-        files.sort()
-        
-        # Get the relative path from the PRD directory
-        rel_path = os.path.relpath(root, prd_path) if root != prd_path else ""
-        
-        # Skip hidden directories
-        if rel_path.startswith('.'):
-            continue
-        
-        # Process markdown files
-        for file in files:
-            if file.endswith('.md'):
-                file_path = os.path.join(root, file)
-                rel_file_path = os.path.join(rel_path, file)
-                
-                # Read file and extract metadata
-                with open(file_path, 'r') as f:
-                    content = f.read()
-                
-                # Extract title from the first line if it's a markdown heading
-                lines = content.split('\n')
-                title = file[:-3]  # Default title: filename without .md
-                if lines and lines[0].startswith('# '):
-                    title = lines[0][2:].strip()
-                
-                # Extract description (use the first paragraph after the title)
-                description = ""
-                for line in lines[1:]:
-                    if line.strip() and not line.startswith('#'):
-                        description = line.strip()
-                        break
-                
-                documents.append({
-                    "title": title,
-                    "description": description[:100] + "..." if len(description) > 100 else description,
-                    "path": rel_file_path,
-                    "modified": datetime.fromtimestamp(os.path.getmtime(file_path)).strftime('%Y-%m-%d %H:%M:%S')
-                })
-    
-    return jsonify({"success": True, "documents": documents})
+    return json_with_etag({"success": True, "documents": documents}, etag)
+
+# Docs tree for the sidebar
+@app.route('/api/docs/tree', methods=['GET'])
+def get_docs_tree():
+    area = request.args.get('area')
+    if area is not None and area not in DOCS_TREE_AREAS:
+        return jsonify({"success": False, "error": f"Unknown docs area: {area}"}), 404
+    
+    tree, etag = docs_tree.snapshot([area] if area else None)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    areas = [{"type": "dir", "name": name, "path": name, "children": children} for name, children in tree.items()]
+    return json_with_etag({"success": True, "tree": areas}, etag)
 
 # Get file content
 @app.route('/api/file/<path:file_path>', methods=['GET'])
@@ -492,15 +674,70 @@ def get_file_content(file_path):
     if not os.path.exists(abs_path) or not os.path.isfile(abs_path):
         return jsonify({"success": False, "error": "File not found"}), 404
     
-    with open(abs_path, 'r') as f:
-        content = f.read()
+    with open(abs_path, 'rb') as f:
+        raw = f.read()
+    content = raw.decode('utf-8').replace('\r\n', '\n')
     
     return jsonify({
         "success": True,
         "content": content,
+        "version": content_version(raw),
         "html_content": render_markdown(content) if file_path.endswith('.md') else None
     })
 
+# Incremental preview: render a document section by section
+@app.route('/api/preview', methods=['POST'])
+def preview_markdown():
+    """
+    Split markdown into top-level sections and return them in order. Sections
+    whose hash the client lists in `known` come back without HTML, so only the
+    edited parts are re-rendered and re-sent. The bundled UI has no editor and
+    does not call this; it is for API clients that keep their own preview.
+    """
+    data = request.get_json(silent=True) or {}
+    content = data.get('content')
+    if not isinstance(content, str):
+        return jsonify({"success": False, "error": "No content provided"}), 400
+    
+    known = set(data.get('known') or [])
+    sections = []
+    for section in split_sections(content):
+        entry = {"hash": section_hash(section)}
+        if entry["hash"] not in known:
+            entry["html"] = render_markdown(section)
+        sections.append(entry)
+    
+    return jsonify({"success": True, "sections": sections})
+
+# Rendered markdown cache counters
+@app.route('/api/stats/render-cache', methods=['GET'])
+def render_cache_stats():
+    return jsonify({"success": True, "stats": render_cache.stats()})
+
+# Background job status
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": "Job not found"}), 404
+    return jsonify({"success": True, "job": job.to_dict()})
+
+@app.route('/api/stats/image-variants', methods=['GET'])
+def image_variant_stats():
+    return jsonify({"success": True, "stats": image_variants.stats()})
+
+@app.route('/api/stats/jobs', methods=['GET'])
+def job_stats():
+    return jsonify({"success": True, "stats": jobs.stats()})
+
+@app.route('/api/stats/diagram-renderer', methods=['GET'])
+def diagram_renderer_stats():
+    return jsonify({"success": True, "stats": diagram_renderer.stats()})
+
+@app.route('/api/stats/responses', methods=['GET'])
+def response_stats():
+    return jsonify({"success": True, "stats": api_responses.stats()})
+
 # Save file content
 @app.route('/api/file/<path:file_path>', methods=['POST'])
 def save_file_content(file_path):
@@ -518,17 +755,80 @@ def save_file_content(file_path):
     # Make sure the directory exists
     os.makedirs(os.path.dirname(abs_path), exist_ok=True)
     
-    with open(abs_path, 'w') as f:
-        f.write(content)
+    with path_lock(abs_path):
+        # A save that names the version it was based on must not overwrite someone else's edit
+        if data.get('base') and os.path.exists(abs_path):
+            with open(abs_path, 'rb') as f:
+                current = content_version(f.read())
+            if current != data['base']:
+                return jsonify({"success": False, "error": "Document changed since it was loaded", "version": current}), 409
+        
+        raw = content.encode('utf-8')
+        write_atomic(abs_path, raw)
+    
+    return jsonify({"success": True, "version": content_version(raw)})
+
+# Apply a partial edit to a file
+@app.route('/api/file/<path:file_path>', methods=['PATCH'])
+def patch_file_content(file_path):
+    """
+    Apply line-range edits ({"edits": [{"start", "end", "text"}]}) or a unified
+    diff ({"diff": "..."}) to the version of the file named by "base". A stale
+    base gets a 409 with the current version; the client re-fetches and retries.
+    The version is that of the bytes on disk, but edits and diffs address the
+    text as GET returns it, with CRLF line endings read as LF, and the result
+    is written back that way, as a full save would.
+    """
+    # Prevent directory traversal
+    file_path = os.path.normpath(file_path)
+    if file_path.startswith('..'):
+        return jsonify({"success": False, "error": "Invalid file path"}), 400
     
-    return jsonify({"success": True})
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not data.get('base') or ('edits' not in data and 'diff' not in data):
+        return jsonify({"success": False, "error": "A base version and edits or a diff are required"}), 400
+    if 'edits' in data and not (isinstance(data['edits'], list) and all(isinstance(edit, dict) for edit in data['edits'])):
+        return jsonify({"success": False, "error": "Edits must be a list of objects"}), 400
+    if 'edits' not in data and not isinstance(data['diff'], str):
+        return jsonify({"success": False, "error": "The diff must be a string"}), 400
+    base = data['base']
+    
+    abs_path = os.path.join(BASE_DOCS_PATH, file_path)
+    if not os.path.isfile(abs_path):
+        return jsonify({"success": False, "error": "File not found"}), 404
+    
+    try:
+        version = patch_file(abs_path, base, data.get('edits'), data.get('diff'))
+    except VersionConflict as e:
+        return jsonify({"success": False, "error": str(e), "version": e.version}), 409
+    except PatchError as e:
+        return jsonify({"success": False, "error": str(e)}), 422
+    
+    return jsonify({"success": True, "version": version})
 
 # API endpoint for plotly data
 @app.route('/api/plotly/generate', methods=['POST'])
 def generate_plotly():
+    """
+    Build a Plotly figure. Long line/bar series can be reduced server-side with
+    "max_points" (and "downsample": "lttb" or "minmax"), and "encoding": "float32"
+    sends numeric series as base64 typed arrays instead of JSON number lists.
+    """
     data = request.json
     plot_type = data.get('type', 'line')
     
+    if data.get('downsample', 'lttb') not in DOWNSAMPLE_METHODS:
+        return jsonify({"success": False, "error": "Invalid downsample method"}), 400
+    if data.get('encoding', 'json') not in ('json', 'float32'):
+        return jsonify({"success": False, "error": "Invalid encoding"}), 400
+    if data.get('max_points') is not None:
+        try:
+            max_points = int(data['max_points'])
+        except (TypeError, ValueError):
+            max_points = -1
+        if max_points < 0:
+            return jsonify({"success": False, "error": "max_points must be a non-negative integer"}), 400
+    
     try:
         # Generate plot based on type
         if plot_type == 'line':
@@ -549,9 +849,25 @@ def generate_plotly():
         return jsonify({"success": False, "error": str(e)}), 500
 
 # Helper functions for generating plots
-def plot_line_chart(data):
+def prepare_series(data):
+    """x and y from the request, downsampled and encoded as the request asks"""
     x = data.get('x', [])
     y = data.get('y', [])
+    
+    max_points = data.get('max_points')
+    if max_points:
+        x, y = downsample(x, y, int(max_points), data.get('downsample', 'lttb'))
+    
+    if data.get('encoding') == 'float32':
+        if numeric_array(y) is not None:
+            y = encode_typed_array(y, 'f4')
+        # x is often an index or timestamp, which float32 would round
+        if len(x) and numeric_array(x) is not None:
+            x = encode_typed_array(x, 'f8')
+    return x, y
+
+def plot_line_chart(data):
+    x, y = prepare_series(data)
     title = data.get('title', 'Line Chart')
     
     fig = {
@@ -561,8 +877,7 @@ def plot_line_chart(data):
     return fig
 
 def plot_bar_chart(data):
-    x = data.get('x', [])
-    y = data.get('y', [])
+    x, y = prepare_series(data)
     title = data.get('title', 'Bar Chart')
     
     fig = {
@@ -583,4 +898,5 @@ def plot_pie_chart(data):
     return fig
 
 if __name__ == '__main__':
+    static_assets.warm()
     app.run(debug=True, host='0.0.0.0', port=5000) 
\ No newline at end of file
@@ -0,0 +1,110 @@
+"""
+Freya - Content-addressed blob store
+Uploaded files stored once per unique content, named by their SHA-256 digest
+"""
+
+import os
+import re
+import time
+import hashlib
+import threading
+
+DIGEST_PATTERN = re.compile(r'\b[0-9a-f]{64}\b')
+
+class BlobStore:
+    """Files kept under root/<first two hex digits>/<digest><ext>.
+
+    Writes hash the stream as it is copied to a temp file, then rename it
+    into place, or drop it if a blob with that digest already exists, so
+    uploading the same bytes twice costs no extra disk space. Blobs are
+    never modified; gc() removes the ones nothing refers to anymore.
+    """
+
+    def __init__(self, root, chunk_size=64 * 1024):
+        self.root = root
+        self.chunk_size = chunk_size
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def relpath(self, digest, ext=''):
+        return f"{digest[:2]}/{digest}{ext.lower()}"
+
+    def path(self, digest, ext=''):
+        return os.path.join(self.root, self.relpath(digest, ext))
+
+    def write(self, stream, ext=''):
+        """Store a stream's content; returns digest, size, relpath and whether it was new"""
+        sha256 = hashlib.sha256()
+        size = 0
+        temp_path = os.path.join(self.root, f".upload-{os.getpid()}-{threading.get_ident()}.tmp")
+        try:
+            with open(temp_path, 'wb') as f:
+                while True:
+                    chunk = stream.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    sha256.update(chunk)
+                    size += len(chunk)
+                    f.write(chunk)
+
+            digest = sha256.hexdigest()
+            final_path = self.path(digest, ext)
+            with self._lock:
+                created = not os.path.exists(final_path)
+                if created:
+                    os.makedirs(os.path.dirname(final_path), exist_ok=True)
+                    os.replace(temp_path, final_path)
+                else:
+                    # Touch it so a concurrent gc() sees it as recently used
+                    os.utime(final_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        return {"digest": digest, "size": size, "relpath": self.relpath(digest, ext), "created": created}
+
+    def iter_blobs(self):
+        """(digest, path) for every stored blob"""
+        for shard in os.listdir(self.root):
+            shard_path = os.path.join(self.root, shard)
+            if len(shard) != 2 or not os.path.isdir(shard_path):
+                continue
+            for name in os.listdir(shard_path):
+                digest = os.path.splitext(name)[0]
+                if DIGEST_PATTERN.fullmatch(digest):
+                    yield digest, os.path.join(shard_path, name)
+
+    def gc(self, references, min_age=3600, dry_run=False):
+        """Delete blobs with no references.
+
+        references maps digest -> reference count. Blobs younger than
+        min_age seconds are kept regardless, since an upload may have written
+        its blob but not yet the record that refers to it.
+        """
+        cutoff = time.time() - min_age
+        removed = []
+        kept = 0
+        freed = 0
+        with self._lock:
+            for digest, path in list(self.iter_blobs()):
+                if references.get(digest, 0) > 0:
+                    kept += 1
+                    continue
+                stat = os.stat(path)
+                if stat.st_mtime > cutoff:
+                    kept += 1
+                    continue
+                removed.append(os.path.relpath(path, self.root).replace(os.sep, '/'))
+                freed += stat.st_size
+                if not dry_run:
+                    os.remove(path)
+
+        return {"removed": removed, "kept": kept, "bytes_freed": freed, "dry_run": dry_run}
+
+def count_references(texts):
+    """digest -> number of times it appears across the given strings"""
+    references = {}
+    for text in texts:
+        for digest in DIGEST_PATTERN.findall(text):
+            references[digest] = references.get(digest, 0) + 1
+    return references
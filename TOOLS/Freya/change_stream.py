@@ -0,0 +1,170 @@
+"""
+Freya - Change stream
+Fans out fine-grained change events to Server-Sent Events subscribers
+"""
+
+import json
+import queue
+import threading
+import uuid
+from collections import deque
+
+class ChangeStream:
+    """Publishes upsert/delete/move/reload events to every connected client.
+
+    Each event gets a monotonically increasing revision. The SSE event id is
+    "<epoch>-<rev>", where the epoch changes with every process, so a
+    reconnecting EventSource can replay what it missed via Last-Event-ID
+    from a bounded history. Clients that fall too far behind, or whose queue
+    overflows, get a "resync" event and are expected to reload in full.
+    """
+
+    def __init__(self, history_size=1000, queue_size=1000, heartbeat=15):
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self._lock = threading.Lock()
+        self._history = deque(maxlen=history_size)
+        self._subscribers = set()
+        self._last_id = 0
+        self.epoch = uuid.uuid4().hex[:8]
+
+    @property
+    def last_id(self):
+        return self._last_id
+
+    def publish(self, collection, action, record=None, record_id=None, **extra):
+        """Record a change and push it to all subscribers"""
+        if record_id is None and record is not None:
+            record_id = record.get('id')
+
+        with self._lock:
+            self._last_id += 1
+            event = {"rev": self._last_id, "collection": collection, "action": action, "id": record_id}
+            if record is not None:
+                event["record"] = record
+            event.update(extra)
+            self._history.append(event)
+            subscribers = list(self._subscribers)
+
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                subscriber.overflowed = True
+        return event
+
+    def events_since(self, rev):
+        """Events after rev, or None if the history no longer reaches back that far"""
+        with self._lock:
+            if rev > self._last_id:
+                return None
+            if rev == self._last_id:
+                return []
+            if not self._history or self._history[0]["rev"] > rev + 1:
+                return None
+            return [event for event in self._history if event["rev"] > rev]
+
+    def cursor(self):
+        """Token for the current revision, in the same "<epoch>-<rev>" form as SSE event ids"""
+        return f"{self.epoch}-{self._last_id}"
+
+    def delta(self, since, collections):
+        """Net changes to some collections after a cursor.
+
+        Returns {"rev", "collections": {name: {"upserts", "deleted"}}}, with
+        several changes to one record collapsed into the last, or None when
+        the caller has to reload in full: the cursor is from another process
+        or older than the history, or a reload happened since.
+        """
+        rev = self._parse_event_id(since or '')
+        events = None if rev is None else self.events_since(rev)
+        if events is None:
+            return None
+
+        latest = {collection: {} for collection in collections}
+        for event in events:
+            if event["action"] == "reload" and (event["collection"] == "*" or event["collection"] in latest):
+                return None
+            records = latest.get(event["collection"])
+            if records is None:
+                continue
+            if event.get("previous_id") is not None:
+                records[event["previous_id"]] = None
+            records.pop(event["id"], None)
+            records[event["id"]] = None if event["action"] == "delete" else event.get("record")
+
+        return {
+            "rev": f"{self.epoch}-{events[-1]['rev'] if events else rev}",
+            "collections": {
+                collection: {
+                    "upserts": [record for record in records.values() if record is not None],
+                    "deleted": [record_id for record_id, record in records.items() if record is None]
+                }
+                for collection, records in latest.items()
+            }
+        }
+
+    def subscribe(self):
+        subscriber = queue.Queue(maxsize=self.queue_size)
+        subscriber.overflowed = False
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def stream(self, last_event_id=None):
+        """Generator of SSE-formatted text for one client connection"""
+        subscriber = self.subscribe()
+        try:
+            if not last_event_id:
+                sent = self._last_id
+                yield self._format({"rev": sent}, "hello", sent)
+            else:
+                rev = self._parse_event_id(last_event_id)
+                missed = None if rev is None else self.events_since(rev)
+                if missed is None:
+                    yield self._format({"rev": self._last_id}, "resync", self._last_id)
+                    return
+                sent = rev
+                for event in missed:
+                    sent = event["rev"]
+                    yield self._format(event, "change", sent)
+
+            while True:
+                try:
+                    event = subscriber.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                if subscriber.overflowed:
+                    yield self._format({"rev": self._last_id}, "resync", self._last_id)
+                    return
+                if event["rev"] <= sent:
+                    continue
+                sent = event["rev"]
+                yield self._format(event, "change", sent)
+        finally:
+            self.unsubscribe(subscriber)
+
+    def _format(self, data, event, rev):
+        return format_sse(data, event, f"{self.epoch}-{rev}")
+
+    def _parse_event_id(self, event_id):
+        """Revision from a Last-Event-ID of this process, or None"""
+        epoch, _, rev = event_id.partition('-')
+        if epoch != self.epoch or not rev.isdigit():
+            return None
+        return int(rev)
+
+def format_sse(data, event=None, event_id=None):
+    """Serialise one Server-Sent Event"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return "\n".join(lines) + "\n\n"
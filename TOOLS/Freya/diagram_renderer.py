@@ -0,0 +1,230 @@
+"""
+Freya - Mermaid diagram rendering
+Renders Mermaid code to SVG on a pool of long-lived workers, with a content-addressed cache
+"""
+
+import os
+import json
+import queue
+import shlex
+import hashlib
+import tempfile
+import threading
+import subprocess
+
+class RenderError(Exception):
+    pass
+
+class RendererWorker:
+    """One long-lived renderer process speaking JSON lines on stdin/stdout.
+
+    Each request is {"code": ..., "options": {...}} on a single line and each
+    reply is {"svg": ...} or {"error": ...}. mermaid_worker.mjs implements
+    this on top of mermaid-cli with one headless browser kept open, but any
+    command that follows the protocol works, e.g. a stub in tests.
+
+    A reply has to arrive within timeout seconds. A worker that misses the
+    deadline or writes anything that is not a reply is killed, since its
+    output can no longer be matched to requests; the next render starts a
+    fresh one.
+    """
+
+    def __init__(self, command, timeout=60):
+        self.command = command
+        self.timeout = timeout
+        self.process = None
+        self._lines = None
+
+    def _start(self):
+        self.process = subprocess.Popen(
+            self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            text=True, encoding='utf-8', bufsize=1)
+        # stdout is drained on a thread so a reply can be waited for with a deadline
+        self._lines = queue.Queue()
+        threading.Thread(target=self._read_lines, args=(self.process.stdout, self._lines), daemon=True).start()
+
+    @staticmethod
+    def _read_lines(stream, lines):
+        try:
+            for line in stream:
+                lines.put(line)
+        except (OSError, ValueError):
+            pass
+        lines.put('')
+
+    def render(self, code, options):
+        if self.process is None or self.process.poll() is not None:
+            self._start()
+        try:
+            self.process.stdin.write(json.dumps({"code": code, "options": options}) + "\n")
+            self.process.stdin.flush()
+        except (OSError, ValueError) as e:
+            self.close()
+            raise RenderError(f"Renderer process failed: {e}")
+
+        try:
+            line = self._lines.get(timeout=self.timeout)
+        except queue.Empty:
+            self.close()
+            raise RenderError(f"Renderer did not answer within {self.timeout}s")
+        if not line:
+            self.close()
+            raise RenderError("Renderer process exited")
+
+        try:
+            reply = json.loads(line)
+        except ValueError:
+            reply = None
+        if not isinstance(reply, dict) or not isinstance(reply.get('svg', reply.get('error')), str):
+            self.close()
+            raise RenderError(f"Renderer sent an unexpected line: {line.strip()[:200]}")
+        if 'error' in reply:
+            raise RenderError(reply['error'])
+        return reply['svg']
+
+    def close(self):
+        if self.process is not None:
+            if self.process.poll() is None:
+                self.process.kill()
+            self.process.wait()
+            for stream in (self.process.stdin, self.process.stdout):
+                try:
+                    stream.close()
+                except (OSError, ValueError):
+                    pass
+            self.process = None
+            self._lines = None
+
+class DiagramRenderer:
+    """Mermaid -> SVG with an on-disk cache keyed by a hash of code and options.
+
+    With a worker command, up to `workers` renderer processes are started on
+    demand and reused, so the Node/browser startup is paid once per worker
+    rather than once per diagram. Without one, each render falls back to a
+    one-shot `mmdc` call, still limited to `workers` at a time. Either way a
+    render that takes longer than timeout seconds fails. Concurrent
+    requests for the same diagram share a single render.
+    """
+
+    def __init__(self, cache_dir, worker_command=None, workers=2, cli='mmdc', timeout=60):
+        self.cache_dir = cache_dir
+        self.worker_command = shlex.split(worker_command) if isinstance(worker_command, str) else worker_command
+        self.cli = cli
+        self.timeout = timeout
+        self._idle = queue.Queue()
+        for _ in range(max(1, workers)):
+            self._idle.put(RendererWorker(self.worker_command, timeout) if self.worker_command else None)
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def cache_key(self, code, options):
+        payload = json.dumps({"code": code, "options": options}, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def cache_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.svg")
+
+    def lookup(self, code, options=None):
+        """The cached SVG for the diagram, or None if it has not been rendered yet"""
+        path = self.cache_path(self.cache_key(code, options or {}))
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                svg = f.read()
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            self.hits += 1
+        return svg
+
+    def render(self, code, options=None):
+        """(svg text, cache hit?) for the diagram, rendering it only if it is not cached"""
+        options = options or {}
+        key = self.cache_key(code, options)
+        path = self.cache_path(key)
+
+        with self._lock:
+            if os.path.exists(path):
+                self.hits += 1
+                with open(path, 'r', encoding='utf-8') as f:
+                    return f.read(), True
+            pending = self._inflight.get(key)
+            owner = pending is None
+            if owner:
+                self.misses += 1
+                pending = self._inflight[key] = {"done": threading.Event()}
+            else:
+                self.hits += 1
+
+        if not owner:
+            pending["done"].wait()
+            if "error" in pending:
+                raise pending["error"]
+            return pending["svg"], True
+
+        try:
+            svg = self._render_uncached(code, options)
+            temp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(svg)
+            os.replace(temp_path, path)
+            pending["svg"] = svg
+            return svg, False
+        except Exception as e:
+            pending["error"] = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            pending["done"].set()
+
+    def _render_uncached(self, code, options):
+        worker = self._idle.get()
+        try:
+            if worker is None:
+                return self._render_cli(code, options)
+            return worker.render(code, options)
+        finally:
+            self._idle.put(worker)
+
+    def _render_cli(self, code, options):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            input_path = os.path.join(temp_dir, 'diagram.mmd')
+            output_path = os.path.join(temp_dir, 'diagram.svg')
+            with open(input_path, 'w', encoding='utf-8') as f:
+                f.write(code)
+
+            command = [self.cli, '-i', input_path, '-o', output_path,
+                       '-b', options.get('background', 'transparent')]
+            if options.get('theme'):
+                command += ['-t', options['theme']]
+            try:
+                result = subprocess.run(command, capture_output=True, text=True, timeout=self.timeout)
+            except (OSError, subprocess.TimeoutExpired) as e:
+                raise RenderError(f"Mermaid CLI failed: {e}")
+            if result.returncode != 0:
+                raise RenderError(result.stderr.strip() or "Mermaid CLI failed")
+
+            with open(output_path, 'r', encoding='utf-8') as f:
+                return f.read()
+
+    def close(self):
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if worker is not None:
+                worker.close()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "mode": "workers" if self.worker_command else "cli",
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+            }
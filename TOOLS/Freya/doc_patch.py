@@ -0,0 +1,159 @@
+"""
+Freya - Document patches
+Partial saves for docs: line-range edits or unified diff hunks applied against a known version
+"""
+
+import os
+import re
+import hashlib
+import threading
+
+HUNK_HEADER = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+
+class PatchError(Exception):
+    """The patch does not apply to the base it names"""
+
+class VersionConflict(Exception):
+    """The file is no longer at the version a patch was based on"""
+
+    def __init__(self, version):
+        super().__init__("Document changed since it was loaded")
+        self.version = version
+
+def content_version(data):
+    """Version tag of a document: the SHA-256 of its bytes"""
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return hashlib.sha256(data).hexdigest()
+
+def apply_line_edits(text, edits):
+    """Apply edits of the form {"start": n, "end": m, "text": "..."} to text.
+
+    Each edit replaces base lines [start, end) (0-based, end exclusive) with
+    its text, which should carry its own line endings. Ranges refer to the
+    base document and must not overlap.
+    """
+    if not isinstance(edits, list):
+        raise PatchError("Edits must be a list")
+    lines = text.splitlines(keepends=True)
+    spans = []
+    for edit in edits:
+        if not isinstance(edit, dict):
+            raise PatchError("Each edit must be an object")
+        try:
+            start, end = int(edit['start']), int(edit['end'])
+        except (KeyError, TypeError, ValueError):
+            raise PatchError("Each edit needs integer start and end line numbers")
+        replacement = edit.get('text', '')
+        if not isinstance(replacement, str):
+            raise PatchError("Edit text must be a string")
+        if not 0 <= start <= end <= len(lines):
+            raise PatchError(f"Edit range {start}-{end} is outside the document ({len(lines)} lines)")
+        spans.append((start, end, replacement))
+
+    spans.sort(key=lambda span: (span[0], span[1]))
+    for (_, previous_end, _), (start, _, _) in zip(spans, spans[1:]):
+        if start < previous_end:
+            raise PatchError("Edits overlap")
+
+    for start, end, replacement in reversed(spans):
+        lines[start:end] = replacement.splitlines(keepends=True)
+    return ''.join(lines)
+
+def apply_unified_diff(text, diff):
+    """Apply the hunks of a unified diff to text, checking every context and removed line"""
+    lines = text.splitlines(keepends=True)
+    result = []
+    position = 0
+    diff_lines = diff.splitlines(keepends=True)
+    i = 0
+    while i < len(diff_lines):
+        header = HUNK_HEADER.match(diff_lines[i])
+        i += 1
+        if not header:
+            continue
+
+        old_start = int(header.group(1))
+        old_count = int(header.group(2)) if header.group(2) is not None else 1
+        # Line numbers are 1-based, except for an empty range
+        hunk_start = old_start - 1 if old_count else old_start
+        if hunk_start < position:
+            raise PatchError("Hunks overlap or are out of order")
+        result.extend(lines[position:hunk_start])
+        position = hunk_start
+
+        last_tag = None
+        while i < len(diff_lines) and not diff_lines[i].startswith('@@'):
+            line = diff_lines[i]
+            i += 1
+            if line.startswith('\\'):
+                # "\ No newline at end of file" applies to the line before it
+                if last_tag in (' ', '+') and result:
+                    result[-1] = result[-1].rstrip('\r\n')
+                continue
+            tag, body = line[:1], line[1:]
+            if line in ('\n', '\r\n'):
+                # A blank context line whose leading space was trimmed
+                tag, body = ' ', line
+            last_tag = tag
+            if tag in (' ', '-'):
+                if position >= len(lines) or lines[position].rstrip('\r\n') != body.rstrip('\r\n'):
+                    raise PatchError(f"Hunk does not match the document at line {position + 1}")
+                if tag == ' ':
+                    result.append(lines[position])
+                position += 1
+            elif tag == '+':
+                result.append(body)
+            else:
+                raise PatchError(f"Malformed diff line: {line.rstrip()}")
+
+    result.extend(lines[position:])
+    return ''.join(result)
+
+def patch_file(path, base, edits=None, diff=None):
+    """Apply line edits, or else a unified diff, to a file that is still at version base.
+
+    Edits and diffs address the text with CRLF line endings read as LF, and
+    the result is written back that way. Raises VersionConflict if the file
+    has changed and PatchError if the patch does not apply; returns the new
+    version.
+    """
+    with path_lock(path):
+        with open(path, 'rb') as f:
+            raw = f.read()
+        current = content_version(raw)
+        if current != base:
+            raise VersionConflict(current)
+
+        try:
+            text = raw.decode('utf-8').replace('\r\n', '\n')
+        except UnicodeDecodeError as e:
+            raise PatchError(str(e))
+        if edits is not None:
+            text = apply_line_edits(text, edits)
+        else:
+            text = apply_unified_diff(text, diff)
+
+        raw = text.encode('utf-8')
+        write_atomic(path, raw)
+    return content_version(raw)
+
+_path_locks = {}
+_path_locks_guard = threading.Lock()
+
+def path_lock(path):
+    """A lock per file, so a version check and the write that follows it cannot interleave"""
+    with _path_locks_guard:
+        lock = _path_locks.get(path)
+        if lock is None:
+            lock = _path_locks[path] = threading.Lock()
+        return lock
+
+def write_atomic(path, data):
+    """Replace a file's bytes in one step, via a temp file in the same directory"""
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
@@ -0,0 +1,142 @@
+"""
+Freya - Docs tree
+Cached listing of the docs folders with titles and summaries read from the top of each file
+"""
+
+import os
+import hashlib
+import threading
+from datetime import datetime
+
+HEAD_BYTES = 8192
+SUMMARY_LENGTH = 200
+
+def read_head(path, limit=HEAD_BYTES):
+    """The first `limit` bytes of a text file, decoded leniently"""
+    with open(path, 'rb') as f:
+        return f.read(limit).decode('utf-8', errors='ignore')
+
+def extract_header(text, default_title):
+    """(title, summary) from the start of a markdown document.
+
+    The title is the first "# " heading, if the document opens with one
+    (after any front matter); the summary is the first paragraph after it.
+    """
+    lines = text.split('\n')
+    if lines and lines[0].strip() == '---':
+        for i, line in enumerate(lines[1:], 1):
+            if line.strip() == '---':
+                lines = lines[i + 1:]
+                break
+
+    while lines and not lines[0].strip():
+        lines = lines[1:]
+
+    title = default_title
+    if lines and lines[0].startswith('# '):
+        title = lines[0][2:].strip()
+        lines = lines[1:]
+
+    paragraph = []
+    for line in lines:
+        if line.strip() and not line.startswith('#'):
+            paragraph.append(line.strip())
+        elif paragraph:
+            break
+    return title, ' '.join(paragraph)[:SUMMARY_LENGTH]
+
+class DocsTree:
+    """The markdown files under each docs area, as a tree for the sidebar.
+
+    Every call re-stats the tree, which is cheap, but only files whose mtime
+    or size changed are opened again, and then only for their first
+    head_bytes. The ETag covers every path, mtime and size, so an unchanged
+    tree is answered with a 304.
+    """
+
+    def __init__(self, root, areas, head_bytes=HEAD_BYTES):
+        self.root = root
+        self.areas = list(areas)
+        self.head_bytes = head_bytes
+        self._lock = threading.Lock()
+        self._files = {}
+
+    def _file_node(self, entry, rel_path, seen):
+        try:
+            stat = entry.stat()
+        except OSError:
+            # Deleted since the directory was listed
+            return None
+        signature = (stat.st_mtime_ns, stat.st_size)
+        cached = self._files.get(entry.path)
+        if cached and cached[0] == signature:
+            meta = cached[1]
+        else:
+            try:
+                text = read_head(entry.path, self.head_bytes)
+            except OSError:
+                return None
+            title, summary = extract_header(text, entry.name[:-3])
+            meta = {
+                "title": title,
+                "summary": summary,
+                "modified": datetime.fromtimestamp(stat.st_mtime).strftime('%Y-%m-%d %H:%M:%S')
+            }
+        seen[entry.path] = (signature, meta)
+        return dict(meta, type="file", name=entry.name, path=rel_path)
+
+    def _scan(self, directory, rel_dir, seen, digest):
+        try:
+            entries = sorted(os.scandir(directory), key=lambda entry: entry.name)
+        except OSError:
+            return []
+
+        dirs = []
+        files = []
+        for entry in entries:
+            if entry.name.startswith('.'):
+                continue
+            rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+            if entry.is_dir():
+                children = self._scan(entry.path, rel_path, seen, digest)
+                dirs.append({"type": "dir", "name": entry.name, "path": rel_path, "children": children})
+            elif entry.name.endswith('.md'):
+                node = self._file_node(entry, rel_path, seen)
+                if node is not None:
+                    digest.update(f"{rel_path}:{seen[entry.path][0]}\n".encode('utf-8'))
+                    files.append(node)
+        return dirs + files
+
+    def snapshot(self, areas=None):
+        """({area: tree}, etag) for the requested areas, or all of them"""
+        areas = self.areas if areas is None else areas
+        digest = hashlib.sha1()
+        seen = {}
+        with self._lock:
+            tree = {}
+            for area in areas:
+                digest.update(f"[{area}]\n".encode('utf-8'))
+                tree[area] = self._scan(os.path.join(self.root, area), area, seen, digest)
+            # Keep cached metadata for areas that were not scanned this time
+            for path, cached in self._files.items():
+                if path not in seen and not any(
+                        path.startswith(os.path.join(self.root, area) + os.sep) for area in areas):
+                    seen[path] = cached
+            self._files = seen
+        return tree, f"docs-{digest.hexdigest()}"
+
+    def documents(self, area):
+        """Flat list of an area's files: each folder's files first, then its subfolders"""
+        tree, etag = self.snapshot([area])
+        documents = []
+
+        def walk(nodes):
+            for node in nodes:
+                if node["type"] == "file":
+                    documents.append(node)
+            for node in nodes:
+                if node["type"] == "dir":
+                    walk(node["children"])
+
+        walk(tree[area])
+        return documents, etag
@@ -0,0 +1,99 @@
+"""
+Freya - Series downsampling
+Shrinks long x/y series to a target point count before they are sent to Plotly
+"""
+
+import base64
+
+import numpy as np
+
+DOWNSAMPLE_METHODS = ('lttb', 'minmax')
+
+def numeric_array(values):
+    """values as a float64 array, or None if they are not all numbers"""
+    try:
+        array = np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        return None
+    return array if array.ndim == 1 else None
+
+def lttb_indices(x, y, threshold):
+    """Indices kept by Largest-Triangle-Three-Buckets.
+
+    The first and last points are always kept; every bucket in between
+    contributes the point forming the largest triangle with the previously
+    kept point and the average of the next bucket. The area computation for
+    a bucket is vectorised; only the walk over buckets is a Python loop.
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        next_x = x[next_start:next_end].mean()
+        next_y = y[next_start:next_end].mean()
+        areas = np.abs((x[previous] - next_x) * (y[start:end] - y[previous])
+                       - (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(areas))
+        indices[i + 1] = previous
+    return indices
+
+def minmax_indices(y, threshold):
+    """Indices of the minimum and maximum of each of threshold // 2 equal buckets, plus both ends"""
+    n = len(y)
+    buckets = max(1, threshold // 2)
+    if threshold >= n or buckets < 2:
+        return np.arange(n)
+
+    size = n // buckets
+    body = y[:size * buckets].reshape(buckets, size)
+    offsets = np.arange(buckets) * size
+    picked = [offsets + np.argmin(body, axis=1), offsets + np.argmax(body, axis=1), [0, n - 1]]
+    if size * buckets < n:
+        tail = y[size * buckets:]
+        picked.append([size * buckets + int(np.argmin(tail)), size * buckets + int(np.argmax(tail))])
+    return np.unique(np.concatenate(picked))
+
+def downsample(x, y, threshold, method='lttb'):
+    """(x, y) reduced to roughly threshold points.
+
+    x may be categorical. When it is empty the kept points' indices are
+    returned as x, so they are still drawn at their original positions.
+    Series of different lengths are cut to the shorter, the points Plotly
+    would draw anyway.
+    """
+    y_values = numeric_array(y)
+    if y_values is None:
+        return x, y
+    if x and len(x) != len(y_values):
+        length = min(len(x), len(y_values))
+        x, y, y_values = x[:length], y[:length], y_values[:length]
+    if len(y_values) <= threshold:
+        return x, y
+
+    x_values = numeric_array(x) if x else None
+    if x_values is None:
+        x_values = np.arange(len(y_values), dtype=np.float64)
+
+    if method == 'minmax':
+        indices = minmax_indices(y_values, threshold)
+    else:
+        indices = lttb_indices(x_values, y_values, threshold)
+
+    if x:
+        x = [x[i] for i in indices]
+    else:
+        x = indices
+    return x, y_values[indices]
+
+def encode_typed_array(values, dtype='f4'):
+    """Plotly's typed-array form {"dtype", "bdata"}: little-endian values, base64 encoded"""
+    array = np.asarray(values, dtype=np.dtype(dtype).newbyteorder('<'))
+    return {"dtype": dtype, "bdata": base64.b64encode(array.tobytes()).decode('ascii')}
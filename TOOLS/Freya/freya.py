@@ -9,14 +9,29 @@ import json
 import uuid
 import time
 import glob
+import atexit
+import base64
+import hashlib
+import heapq
+import threading
+import concurrent.futures
 import frontmatter
-import markdown
 import webbrowser
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
 from datetime import datetime
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
-from flask import Flask, request, jsonify, render_template, send_from_directory
+from flask import Flask, Response, request, jsonify, render_template, url_for
 from flask_cors import CORS
+from api_response import ApiResponses
+from change_stream import ChangeStream
+from render_cache import RenderCache
+from static_assets import StaticAssets
+from docs_tree import HEAD_BYTES, read_head
 
 # Configuration
 APP_NAME = "Freya"
@@ -25,123 +40,156 @@ DATA_DIR = os.path.abspath("../docs")
 IDEAS_DIR = os.path.join(DATA_DIR, "Ideas")
 TASKS_DIR = os.path.join(DATA_DIR, "Development/Tasks")
 PRD_DIR = os.path.join(DATA_DIR, "PRD")
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache")
+INDEX_CACHE_FILE = os.path.join(CACHE_DIR, "doc_index.json")
+INDEX_CACHE_VERSION = 3
+# The cold scan in __main__ fans file parsing out over a pool of SCAN_WORKERS ("process"
+# or "thread"); reloads while serving always use threads
+SCAN_WORKERS = int(os.environ.get("FREYA_SCAN_WORKERS", os.cpu_count() or 1))
+SCAN_EXECUTOR = os.environ.get("FREYA_SCAN_EXECUTOR", "process")
+PARALLEL_SCAN_MIN_FILES = 200
+RENDER_CACHE_BYTES = int(os.environ.get("FREYA_RENDER_CACHE_BYTES", 32 * 1024 * 1024))
+API_COMPRESS_MIN_BYTES = int(os.environ.get("FREYA_API_COMPRESS_MIN_BYTES", 1024))
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+ASSET_CACHE_DIR = os.path.join(CACHE_DIR, "assets")
+TASK_COUNTER_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "task_counter.json")
+
+IDEA_CATEGORIES = ["Gameplay", "UI", "Graphics", "Sound", "Economy", "Story", "Technical", "Meta"]
+TASK_STATUSES = ["Backlog", "NextUp", "InProgress", "Review", "Done"]
 
 # Ensure directories exist
 def ensure_dirs():
-    for directory in [IDEAS_DIR] + [os.path.join(IDEAS_DIR, cat) for cat in 
-                     ["Gameplay", "UI", "Graphics", "Sound", "Economy", "Story", "Technical", "Meta"]]:
+    for directory in [IDEAS_DIR] + [os.path.join(IDEAS_DIR, cat) for cat in IDEA_CATEGORIES]:
         os.makedirs(directory, exist_ok=True)
     
-    for directory in [TASKS_DIR] + [os.path.join(TASKS_DIR, status) for status in 
-                     ["Backlog", "NextUp", "InProgress", "Review", "Done"]]:
+    for directory in [TASKS_DIR] + [os.path.join(TASKS_DIR, status) for status in TASK_STATUSES]:
         os.makedirs(directory, exist_ok=True)
 
 # Initialize Flask
-app = Flask(__name__, static_folder="static", template_folder="templates")
-CORS(app)
+app = Flask(__name__, static_folder=None, template_folder="templates")
+# Paging headers have to be exposed for cross-origin clients to read them
+CORS(app, expose_headers=['X-Next-Cursor', 'X-Total-Count'])
+api_responses = ApiResponses(app, min_size=API_COMPRESS_MIN_BYTES)
+
+render_cache = RenderCache(RENDER_CACHE_BYTES)
+static_assets = StaticAssets(STATIC_DIR, ASSET_CACHE_DIR)
+
+def doc_id(path):
+    """Stable ID for a document, derived from its path under DATA_DIR"""
+    rel_path = os.path.relpath(os.path.abspath(path), DATA_DIR).replace(os.sep, '/')
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"freya:{rel_path}"))
 
 # File change handler for auto-reload
 class FileChangeHandler(FileSystemEventHandler):
     def on_any_event(self, event):
-        if event.is_directory or event.event_type == 'closed':
+        if event.event_type not in ('created', 'modified', 'deleted', 'moved'):
+            return
+        if event.is_directory:
+            # Files inside a moved or deleted directory get no events of their own
+            if event.event_type in ('moved', 'deleted'):
+                doc_index.load()
             return
-        print(f"Detected change in {event.src_path}, reloading data...")
+        print(f"Detected change in {event.src_path}, updating index...")
+        
+        if event.event_type == 'moved':
+            doc_index.move(event.src_path, event.dest_path)
+        elif event.event_type == 'deleted':
+            doc_index.remove(event.src_path)
+        else:
+            doc_index.refresh(event.src_path)
 
 # -------------------- Idea Management --------------------
 
 def get_ideas():
-    """Get all ideas from the Ideas directory"""
-    ideas = []
-    for category in ["Gameplay", "UI", "Graphics", "Sound", "Economy", "Story", "Technical", "Meta"]:
-        category_dir = os.path.join(IDEAS_DIR, category)
-        if not os.path.exists(category_dir):
-            continue
+    """Get all ideas from the in-memory document index"""
+    return doc_index.ideas()
+
+def parse_idea_file(idea_file, category):
+    """Parse a single idea file, returning None if it cannot be read"""
+    try:
+        with open(idea_file, 'r', encoding='utf-8') as f:
+            post = frontmatter.load(f)
             
-        for idea_file in glob.glob(os.path.join(category_dir, "*.md")):
-            try:
-                with open(idea_file, 'r', encoding='utf-8') as f:
-                    post = frontmatter.load(f)
-                    
-                    # Extract metadata
-                    title = os.path.basename(idea_file).replace(".md", "").replace("-", " ").title()
-                    if 'title' in post.metadata:
-                        title = post.metadata['title']
-                    
-                    # Parse content to find sections and tags
-                    content = post.content
-                    sections = {}
-                    current_section = "content"
+            # Extract metadata
+            title = os.path.basename(idea_file).replace(".md", "").replace("-", " ").title()
+            if 'title' in post.metadata:
+                title = post.metadata['title']
+            
+            # Parse content to find sections and tags
+            content = post.content
+            sections = {}
+            current_section = "content"
+            sections[current_section] = []
+            
+            status = "Brainstorming"
+            score = {"impact": 0, "feasibility": 0, "originality": 0, "player_value": 0, "alignment": 0, "total": 0}
+            tags = []
+            summary = ""
+            
+            for line in content.split('\n'):
+                if line.startswith('# '):
+                    title = line[2:].strip()
+                elif line.startswith('## '):
+                    current_section = line[3:].strip().lower()
                     sections[current_section] = []
-                    
-                    status = "Brainstorming"
-                    score = {"impact": 0, "feasibility": 0, "originality": 0, "player_value": 0, "alignment": 0, "total": 0}
-                    tags = []
-                    summary = ""
-                    
-                    for line in content.split('\n'):
-                        if line.startswith('# '):
-                            title = line[2:].strip()
-                        elif line.startswith('## '):
-                            current_section = line[3:].strip().lower()
-                            sections[current_section] = []
-                        elif line.startswith('- **Total Score**:'):
-                            try:
-                                score["total"] = int(line.split(':')[1].strip())
-                            except:
-                                pass
-                        elif line.startswith('- Impact:'):
-                            try:
-                                score["impact"] = int(line.split(':')[1].strip())
-                            except:
-                                pass
-                        elif line.startswith('- Feasibility:'):
-                            try:
-                                score["feasibility"] = int(line.split(':')[1].strip())
-                            except:
-                                pass
-                        elif line.startswith('- Originality:'):
-                            try:
-                                score["originality"] = int(line.split(':')[1].strip())
-                            except:
-                                pass
-                        elif line.startswith('- Player Value:'):
-                            try:
-                                score["player_value"] = int(line.split(':')[1].strip())
-                            except:
-                                pass
-                        elif line.startswith('- Alignment with Game Vision:'):
-                            try:
-                                score["alignment"] = int(line.split(':')[1].strip())
-                            except:
-                                pass
-                        elif current_section == "status":
-                            status = line.strip()
-                        elif current_section == "summary":
-                            summary += line.strip() + " "
-                        elif current_section == "tags":
-                            tags = [tag.strip() for tag in line.split('#') if tag.strip()]
-                        else:
-                            sections[current_section].append(line)
-                    
-                    # Build idea object
-                    idea = {
-                        "id": str(uuid.uuid4()),
-                        "title": title,
-                        "category": category,
-                        "status": status,
-                        "summary": summary.strip(),
-                        "score": score,
-                        "tags": tags,
-                        "file_path": idea_file,
-                        "created": datetime.fromtimestamp(os.path.getctime(idea_file)).strftime("%Y-%m-%d"),
-                        "modified": datetime.fromtimestamp(os.path.getmtime(idea_file)).strftime("%Y-%m-%d")
-                    }
-                    
-                    ideas.append(idea)
-            except Exception as e:
-                print(f"Error processing idea file {idea_file}: {e}")
-    
-    return sorted(ideas, key=lambda i: i.get('score', {}).get('total', 0), reverse=True)
+                elif line.startswith('- **Total Score**:'):
+                    try:
+                        score["total"] = int(line.split(':')[1].strip())
+                    except:
+                        pass
+                elif line.startswith('- Impact:'):
+                    try:
+                        score["impact"] = int(line.split(':')[1].strip())
+                    except:
+                        pass
+                elif line.startswith('- Feasibility:'):
+                    try:
+                        score["feasibility"] = int(line.split(':')[1].strip())
+                    except:
+                        pass
+                elif line.startswith('- Originality:'):
+                    try:
+                        score["originality"] = int(line.split(':')[1].strip())
+                    except:
+                        pass
+                elif line.startswith('- Player Value:'):
+                    try:
+                        score["player_value"] = int(line.split(':')[1].strip())
+                    except:
+                        pass
+                elif line.startswith('- Alignment with Game Vision:'):
+                    try:
+                        score["alignment"] = int(line.split(':')[1].strip())
+                    except:
+                        pass
+                elif current_section == "status" and line.strip():
+                    status = line.strip()
+                elif current_section == "summary":
+                    summary += line.strip() + " "
+                elif current_section == "tags" and line.strip():
+                    tags = [tag.strip() for tag in line.split('#') if tag.strip()]
+                else:
+                    sections[current_section].append(line)
+            
+            # Build idea object
+            idea = {
+                "id": doc_id(idea_file),
+                "title": title,
+                "category": category,
+                "status": status,
+                "summary": summary.strip(),
+                "score": score,
+                "tags": tags,
+                "file_path": idea_file,
+                "created": datetime.fromtimestamp(os.path.getctime(idea_file)).strftime("%Y-%m-%d"),
+                "modified": datetime.fromtimestamp(os.path.getmtime(idea_file)).strftime("%Y-%m-%d")
+            }
+            
+            return idea
+    except Exception as e:
+        print(f"Error processing idea file {idea_file}: {e}")
+    
+    return None
 
 def save_idea(idea_data):
     """Save an idea to a markdown file"""
@@ -172,6 +220,7 @@ def save_idea(idea_data):
     
     # Format content
     today = datetime.now().strftime("%Y-%m-%d")
+    notes = idea_data.get('notes', '- Add any additional notes or considerations here\n- Links to related ideas or research')
     
     content = f"""# {title}
 
@@ -199,7 +248,7 @@ def save_idea(idea_data):
 - **Total Score**: {total}
 
 ## Notes
-{idea_data.get('notes', '- Add any additional notes or considerations here\n- Links to related ideas or research')}
+{notes}
 
 ## Created: {today}
 ## Last Updated: {today}
@@ -208,72 +257,70 @@ def save_idea(idea_data):
     # Write to file
     with open(file_path, 'w', encoding='utf-8') as f:
         f.write(content)
+    doc_index.refresh(file_path)
     
     return {"success": True, "file_path": file_path}
 
 # -------------------- Task Management --------------------
 
 def get_tasks():
-    """Get all tasks from the Tasks directory"""
-    tasks = []
-    for status in ["Backlog", "NextUp", "InProgress", "Review", "Done"]:
-        status_dir = os.path.join(TASKS_DIR, status)
-        if not os.path.exists(status_dir):
-            continue
+    """Get all tasks from the in-memory document index"""
+    return doc_index.tasks()
+
+def parse_task_file(task_file, status):
+    """Parse a single task file, returning None if it cannot be read"""
+    try:
+        with open(task_file, 'r', encoding='utf-8') as f:
+            content = f.read()
             
-        for task_file in glob.glob(os.path.join(status_dir, "*.md")):
-            try:
-                with open(task_file, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                    
-                    # Extract task information
-                    task_id = ""
-                    task_type = ""
-                    estimated_time = ""
-                    milestone = ""
-                    priority = "Medium"
-                    description = ""
-                    title = os.path.basename(task_file).split('-', 3)[-1].replace(".md", "").replace("-", " ").title()
-                    
-                    # Parse basic info section
-                    if "## Basic Information" in content:
-                        info_section = content.split("## Basic Information")[1].split("##")[0]
-                        for line in info_section.split("\n"):
-                            if "**ID**:" in line:
-                                task_id = line.split("**ID**:")[1].strip()
-                            elif "**Type**:" in line:
-                                task_type = line.split("**Type**:")[1].strip()
-                            elif "**Estimated Time**:" in line:
-                                estimated_time = line.split("**Estimated Time**:")[1].strip()
-                            elif "**Milestone**:" in line:
-                                milestone = line.split("**Milestone**:")[1].strip()
-                            elif "**Priority**:" in line:
-                                priority = line.split("**Priority**:")[1].strip()
-                    
-                    # Get description
-                    if "## Description" in content:
-                        description = content.split("## Description")[1].split("##")[0].strip()
-                    
-                    # Build task object
-                    task = {
-                        "id": task_id,
-                        "title": title,
-                        "type": task_type,
-                        "status": status,
-                        "estimated_time": estimated_time,
-                        "milestone": milestone,
-                        "priority": priority,
-                        "description": description,
-                        "file_path": task_file,
-                        "created": datetime.fromtimestamp(os.path.getctime(task_file)).strftime("%Y-%m-%d"),
-                        "modified": datetime.fromtimestamp(os.path.getmtime(task_file)).strftime("%Y-%m-%d")
-                    }
-                    
-                    tasks.append(task)
-            except Exception as e:
-                print(f"Error processing task file {task_file}: {e}")
-    
-    return sorted(tasks, key=lambda t: t.get('modified', ''), reverse=True)
+            # Extract task information
+            task_id = ""
+            task_type = ""
+            estimated_time = ""
+            milestone = ""
+            priority = "Medium"
+            description = ""
+            title = os.path.basename(task_file).split('-', 3)[-1].replace(".md", "").replace("-", " ").title()
+            
+            # Parse basic info section
+            if "## Basic Information" in content:
+                info_section = content.split("## Basic Information")[1].split("##")[0]
+                for line in info_section.split("\n"):
+                    if "**ID**:" in line:
+                        task_id = line.split("**ID**:")[1].strip()
+                    elif "**Type**:" in line:
+                        task_type = line.split("**Type**:")[1].strip()
+                    elif "**Estimated Time**:" in line:
+                        estimated_time = line.split("**Estimated Time**:")[1].strip()
+                    elif "**Milestone**:" in line:
+                        milestone = line.split("**Milestone**:")[1].strip()
+                    elif "**Priority**:" in line:
+                        priority = line.split("**Priority**:")[1].strip()
+            
+            # Get description
+            if "## Description" in content:
+                description = content.split("## Description")[1].split("##")[0].strip()
+            
+            # Build task object
+            task = {
+                "id": task_id,
+                "title": title,
+                "type": task_type,
+                "status": status,
+                "estimated_time": estimated_time,
+                "milestone": milestone,
+                "priority": priority,
+                "description": description,
+                "file_path": task_file,
+                "created": datetime.fromtimestamp(os.path.getctime(task_file)).strftime("%Y-%m-%d"),
+                "modified": datetime.fromtimestamp(os.path.getmtime(task_file)).strftime("%Y-%m-%d")
+            }
+            
+            return task
+    except Exception as e:
+        print(f"Error processing task file {task_file}: {e}")
+    
+    return None
 
 def save_task(task_data):
     """Save a task to a markdown file"""
@@ -288,12 +335,8 @@ def save_task(task_data):
     
     # Create task ID and filename
     today = datetime.now().strftime("%Y-%m-%d")
-    # Get the number of tasks created today to create a sequence number
+    task_id = allocate_task_id(today)
     status_dir = os.path.join(TASKS_DIR, status)
-    existing_tasks = glob.glob(os.path.join(status_dir, f"{today}-*.md"))
-    sequence = len(existing_tasks) + 1
-    
-    task_id = f"{today}-{sequence:02d}"
     filename = f"{task_id}-{title.lower().replace(' ', '-')}.md"
     
     os.makedirs(status_dir, exist_ok=True)
@@ -358,22 +401,72 @@ def save_task(task_data):
     # Write to file
     with open(file_path, 'w', encoding='utf-8') as f:
         f.write(content)
+    doc_index.refresh(file_path)
     
     return {"success": True, "file_path": file_path, "task_id": task_id}
 
+_task_counter_lock = threading.Lock()
+
+def lock_file(f):
+    if fcntl:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+
+def unlock_file(f):
+    if fcntl:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+def allocate_task_id(today):
+    """Reserve the next task ID for the given day.
+    
+    The sequence lives in TASK_COUNTER_FILE and is bumped under both a thread
+    lock and an exclusive file lock, so concurrent saves and other Freya
+    processes never receive the same ID. Every allocation also looks up the
+    highest ID of the day already in the index, across all statuses, so task
+    files that arrive some other way (a git pull, a copied file) are never
+    handed out again; the index keeps that per day, so no task list is scanned.
+    """
+    os.makedirs(os.path.dirname(TASK_COUNTER_FILE), exist_ok=True)
+    fd = os.open(TASK_COUNTER_FILE, os.O_RDWR | os.O_CREAT)
+    with _task_counter_lock, os.fdopen(fd, 'r+', encoding='utf-8') as f:
+        lock_file(f)
+        try:
+            f.seek(0)
+            try:
+                counter = json.loads(f.read() or '{}')
+            except ValueError:
+                counter = {}
+            
+            sequence = doc_index.max_task_sequence(today)
+            if counter.get("date") == today:
+                sequence = max(sequence, int(counter.get("sequence", 0)))
+            sequence += 1
+            
+            f.seek(0)
+            f.truncate()
+            json.dump({"date": today, "sequence": sequence}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        finally:
+            unlock_file(f)
+    
+    return f"{today}-{sequence:02d}"
+
 def update_task_status(task_id, new_status):
     """Move a task file to a new status directory"""
-    task_files = []
-    for status in ["Backlog", "NextUp", "InProgress", "Review", "Done"]:
-        status_dir = os.path.join(TASKS_DIR, status)
-        if os.path.exists(status_dir):
-            for task_file in glob.glob(os.path.join(status_dir, f"*{task_id}*.md")):
-                task_files.append((task_file, status))
-    
-    if not task_files:
+    if new_status not in TASK_STATUSES:
+        return {"success": False, "error": f"Unknown status {new_status}"}
+    
+    task_file = doc_index.task_path(task_id)
+    if not task_file:
         return {"success": False, "error": f"Task with ID {task_id} not found"}
     
-    task_file, current_status = task_files[0]
+    current_status = os.path.basename(os.path.dirname(task_file))
     if current_status == new_status:
         return {"success": True, "message": "Task already in this status"}
     
@@ -385,53 +478,557 @@ def update_task_status(task_id, new_status):
     
     # Move the file
     os.rename(task_file, new_file_path)
+    doc_index.move(task_file, new_file_path)
     
     return {"success": True, "file_path": new_file_path}
 
+def update_task_statuses(updates):
+    """Apply many {id, status} moves in one go, returning a result per item"""
+    results = []
+    for update in updates:
+        task_id = update.get('id') if isinstance(update, dict) else None
+        new_status = update.get('status') if isinstance(update, dict) else None
+        if not task_id or not new_status:
+            result = {"success": False, "error": "Each update needs an id and a status"}
+        else:
+            result = update_task_status(task_id, new_status)
+        results.append(dict(result, id=task_id))
+    
+    return {"success": all(r["success"] for r in results), "results": results}
+
 # -------------------- PRD Management --------------------
 
 def get_prd_docs():
-    """Get all PRD documents"""
-    prd_docs = []
+    """Get all PRD documents from the in-memory document index"""
+    return doc_index.prd_docs()
+
+def parse_prd_file(doc_file):
+    """Parse a single PRD document, returning None if it cannot be read"""
+    try:
+        # The title and first paragraph are near the top; the rest is never read
+        content = read_head(doc_file)
+        
+        # Extract title (first h1)
+        title = os.path.basename(doc_file).replace(".md", "").replace("-", " ").title()
+        if content.startswith('# '):
+            title = content.split('\n')[0][2:].strip()
+        
+        # Get a summary (first paragraph after title)
+        summary = ""
+        in_summary = False
+        for line in content.split('\n')[1:]:
+            if line.strip() and not line.startswith('#') and not in_summary:
+                in_summary = True
+                summary += line.strip() + " "
+            elif in_summary and (not line.strip() or line.startswith('#')):
+                break
+            elif in_summary:
+                summary += line.strip() + " "
+        
+        # Build PRD doc object
+        prd_doc = {
+            "id": doc_id(doc_file),
+            "title": title,
+            "summary": summary.strip(),
+            "file_path": doc_file,
+            "created": datetime.fromtimestamp(os.path.getctime(doc_file)).strftime("%Y-%m-%d"),
+            "modified": datetime.fromtimestamp(os.path.getmtime(doc_file)).strftime("%Y-%m-%d")
+        }
+        
+        return prd_doc
+    except Exception as e:
+        print(f"Error processing PRD file {doc_file}: {e}")
     
-    if os.path.exists(PRD_DIR):
-        for doc_file in glob.glob(os.path.join(PRD_DIR, "*.md")):
+    return None
+
+# -------------------- Document Index --------------------
+
+def classify_doc_path(path):
+    """Work out which collection a markdown file belongs to.
+    
+    Returns ("idea", category), ("task", status) or ("prd", None), or None
+    for files that Freya does not track.
+    """
+    path = os.path.abspath(path)
+    if not path.endswith('.md'):
+        return None
+    
+    parent = os.path.dirname(path)
+    group = os.path.basename(parent)
+    if os.path.dirname(parent) == IDEAS_DIR and group in IDEA_CATEGORIES:
+        return ("idea", group)
+    if os.path.dirname(parent) == TASKS_DIR and group in TASK_STATUSES:
+        return ("task", group)
+    if parent == PRD_DIR:
+        return ("prd", None)
+    return None
+
+def parse_doc_file(path, kind, group):
+    """Dispatch a file to the parser for its collection"""
+    if kind == "idea":
+        return parse_idea_file(path, group)
+    if kind == "task":
+        return parse_task_file(path, group)
+    return parse_prd_file(path)
+
+def iter_doc_files():
+    """Yield (path, kind, group) for every markdown file Freya tracks"""
+    for category in IDEA_CATEGORIES:
+        for idea_file in glob.glob(os.path.join(IDEAS_DIR, category, "*.md")):
+            yield os.path.abspath(idea_file), "idea", category
+    for status in TASK_STATUSES:
+        for task_file in glob.glob(os.path.join(TASKS_DIR, status, "*.md")):
+            yield os.path.abspath(task_file), "task", status
+    for doc_file in glob.glob(os.path.join(PRD_DIR, "*.md")):
+        yield os.path.abspath(doc_file), "prd", None
+
+def hash_file(path, limit=None):
+    """SHA-1 of a file's bytes, or of its first `limit` bytes, read in chunks"""
+    digest = hashlib.sha1()
+    remaining = limit
+    with open(path, 'rb') as f:
+        while remaining is None or remaining > 0:
+            chunk = f.read(65536 if remaining is None else min(65536, remaining))
+            if not chunk:
+                break
+            digest.update(chunk)
+            if remaining is not None:
+                remaining -= len(chunk)
+    return digest.hexdigest()
+
+def reuse_cache_entry(path, kind, group, cached):
+    """Check a cached entry against its file without parsing it.
+    
+    An entry whose mtime and size still match is reused without opening the
+    file. If only the mtime moved (a checkout or touch), the content hash
+    decides whether the cached record is still valid. PRD records come from
+    the head of the file only, so only that part is hashed for them.
+    Returns (entry or None, the hash if one was taken).
+    """
+    if not cached or cached.get("kind") != kind or cached.get("group") != group:
+        return None, None
+    
+    stat = os.stat(path)
+    if cached["mtime"] == stat.st_mtime_ns and cached["size"] == stat.st_size:
+        return cached, None
+    if cached["size"] != stat.st_size:
+        return None, None
+    
+    digest = hash_file(path, HEAD_BYTES if kind == "prd" else None)
+    if digest != cached["hash"]:
+        return None, digest
+    record = dict(cached["record"])
+    record["created"] = datetime.fromtimestamp(stat.st_ctime).strftime("%Y-%m-%d")
+    record["modified"] = datetime.fromtimestamp(stat.st_mtime).strftime("%Y-%m-%d")
+    return dict(cached, mtime=stat.st_mtime_ns, record=record), digest
+
+def parse_cache_entry(path, kind, group, digest=None):
+    """Parse a file into a new cache entry; digest is its hash if already known"""
+    stat = os.stat(path)
+    record = parse_doc_file(path, kind, group)
+    if record is None:
+        return None
+    
+    return {
+        "kind": kind,
+        "group": group,
+        "mtime": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "hash": digest or hash_file(path, HEAD_BYTES if kind == "prd" else None),
+        "record": record
+    }
+
+def load_cache_entry(path, kind, group, cached=None):
+    """Return the cache entry for a file, re-parsing only if it changed"""
+    entry, digest = reuse_cache_entry(path, kind, group, cached)
+    return entry or parse_cache_entry(path, kind, group, digest)
+
+def relocate_entry(entry, path, group):
+    """Copy of a cache entry for the same file under a new directory"""
+    record = dict(entry["record"], file_path=path)
+    if entry["kind"] == "idea":
+        record["id"] = doc_id(path)
+        record["category"] = group
+    elif entry["kind"] == "task":
+        record["status"] = group
+    elif entry["kind"] == "prd":
+        record["id"] = doc_id(path)
+    return dict(entry, group=group, record=record)
+
+KIND_COLLECTIONS = {"idea": "ideas", "task": "tasks", "prd": "prd"}
+
+PRIORITY_RANK = {"low": 1, "medium": 2, "high": 3, "critical": 4}
+
+# Fields that can be filtered on, mapped to the record attribute they index
+QUERY_FIELDS = {
+    "idea": {"status": "status", "category": "category", "tag": "tags"},
+    "task": {"status": "status", "milestone": "milestone", "priority": "priority", "type": "type"}
+}
+
+# Orderings accepted by DocumentIndex.query(), prefix with "-" for descending
+ORDER_KEYS = {
+    "idea": {
+        "score": lambda i: i.get('score', {}).get('total', 0),
+        "title": lambda i: i.get('title', '').lower(),
+        "created": lambda i: i.get('created', ''),
+        "modified": lambda i: i.get('modified', '')
+    },
+    "task": {
+        "modified": lambda t: t.get('modified', ''),
+        "created": lambda t: t.get('created', ''),
+        "title": lambda t: t.get('title', '').lower(),
+        "id": lambda t: t.get('id', ''),
+        "priority": lambda t: PRIORITY_RANK.get(t.get('priority', '').lower(), 0)
+    }
+}
+DEFAULT_ORDER = {"idea": "-score", "task": "-modified"}
+
+def encode_cursor(order, key, path):
+    """Opaque page cursor: the sort order plus the last (key, path), path relative to DATA_DIR"""
+    rel_path = os.path.relpath(path, DATA_DIR).replace(os.sep, '/')
+    return base64.urlsafe_b64encode(json.dumps([order, key, rel_path]).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor, order):
+    """(key, absolute path) from a cursor, which must have been issued for the same order"""
+    try:
+        cursor_order, key, rel_path = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (TypeError, ValueError):
+        raise ValueError("Invalid cursor")
+    if cursor_order != order:
+        raise ValueError("Cursor belongs to a different sort order")
+    if not isinstance(rel_path, str):
+        raise ValueError("Invalid cursor")
+    return key, os.path.abspath(os.path.join(DATA_DIR, rel_path))
+
+def index_values(value):
+    """Normalised secondary index keys for a record attribute"""
+    if isinstance(value, list):
+        return {str(v).strip().lower() for v in value if str(v).strip()}
+    if value:
+        return {str(value).strip().lower()}
+    return set()
+
+def scan_entry(job):
+    """Pool worker: parse the file of one (path, kind, group, digest) job"""
+    path, kind, group, digest = job
+    try:
+        return parse_cache_entry(path, kind, group, digest)
+    except OSError as e:
+        print(f"Error indexing {path}: {e}")
+        return None
+
+def scan_entries(jobs, workers=1, executor="process"):
+    """Build the cache entries for (path, kind, group, cached) jobs, in job order.
+    
+    Cached entries are checked here, so only the files that have to be
+    parsed again are handed to the pool, and only when there are enough of
+    them to be worth it. Results come back in job order whatever the pool
+    does, so the merged index is the same as a serial scan.
+    """
+    entries = [None] * len(jobs)
+    misses = []
+    for i, (path, kind, group, cached) in enumerate(jobs):
+        try:
+            entry, digest = reuse_cache_entry(path, kind, group, cached)
+        except OSError as e:
+            print(f"Error indexing {path}: {e}")
+            continue
+        if entry:
+            entries[i] = entry
+        else:
+            misses.append((i, (path, kind, group, digest)))
+    
+    if workers <= 1 or len(misses) < PARALLEL_SCAN_MIN_FILES:
+        parsed = [scan_entry(job) for _, job in misses]
+    else:
+        pool_class = (concurrent.futures.ThreadPoolExecutor if executor == "thread"
+                      else concurrent.futures.ProcessPoolExecutor)
+        chunksize = max(1, len(misses) // (workers * 8))
+        with pool_class(max_workers=workers) as pool:
+            parsed = list(pool.map(scan_entry, [job for _, job in misses], chunksize=chunksize))
+    
+    for (i, _), entry in zip(misses, parsed):
+        entries[i] = entry
+    return entries
+
+class DocumentIndex:
+    """Resident index of parsed ideas, tasks and PRD documents.
+    
+    The index is filled by one full scan and then kept current one file at a
+    time by the save helpers and the watchdog handler, so the list endpoints
+    are served from memory instead of re-reading the docs tree. Parsed
+    records are persisted to INDEX_CACHE_FILE so that a restart only
+    re-parses the files that changed while Freya was not running.
+    """
+    
+    SORT_KEYS = {
+        "idea": lambda i: i.get('score', {}).get('total', 0),
+        "task": lambda t: t.get('modified', ''),
+        "prd": lambda d: d.get('modified', '')
+    }
+    
+    def __init__(self, cache_file=None, workers=1, executor="process", changes=None):
+        self.cache_file = cache_file
+        self.changes = changes
+        self.workers = workers
+        self.executor = executor
+        self._lock = threading.RLock()
+        self._reset()
+        self._loaded = False
+    
+    def _reset(self):
+        self._entries = {}
+        self._records = {kind: {} for kind in self.SORT_KEYS}
+        self._task_paths = {}
+        self._task_days = {}
+        self._fields = {kind: {name: {} for name in fields} for kind, fields in QUERY_FIELDS.items()}
+        self._views = {}
+    
+    def load(self, cold_start=False):
+        """(Re)build the whole index, reusing cached records where possible.
+        
+        Only the cold start, before any other thread is running, may use the
+        process pool; forking once request and watchdog threads exist can
+        deadlock the child, so later reloads parse on threads.
+        """
+        cached_entries = self._read_cache()
+        jobs = [(path, kind, group, cached_entries.get(path))
+                for path, kind, group in sorted(iter_doc_files())]
+        entries = scan_entries(jobs, self.workers, self.executor if cold_start else "thread")
+        
+        with self._lock:
+            self._reset()
+            for job, entry in zip(jobs, entries):
+                if entry:
+                    self._add(job[0], entry)
+            self._loaded = True
+            if self.changes:
+                self.changes.publish("*", "reload")
+        self.save_cache()
+    
+    def ensure_loaded(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self.load()
+    
+    def ideas(self):
+        return self.view("idea")[0]
+    
+    def tasks(self):
+        return self.view("task")[0]
+    
+    def prd_docs(self):
+        return self.view("prd")[0]
+    
+    def query(self, kind, filters=None, order=None, limit=None, cursor=None):
+        """Filter, order and page a collection.
+        
+        filters maps QUERY_FIELDS names to lists of accepted values (matched
+        case-insensitively) and is answered from the secondary indexes.
+        Records are ordered by (key, path), and a page is picked with a heap
+        so only `limit` records are ever sorted. The returned cursor encodes
+        the order and the last position handed out, so it stays valid while
+        other records come and go but is refused for any other order.
+        Returns (records, next_cursor, total_matches).
+        """
+        self.ensure_loaded()
+        order = order or DEFAULT_ORDER[kind]
+        descending = order.startswith('-')
+        order_key = ORDER_KEYS[kind].get(order.lstrip('-'))
+        if order_key is None:
+            raise ValueError(f"Cannot sort {kind}s by {order.lstrip('-')}")
+        
+        with self._lock:
+            paths = None
+            for name, values in (filters or {}).items():
+                if name not in QUERY_FIELDS[kind]:
+                    raise ValueError(f"Cannot filter {kind}s by {name}")
+                index = self._fields[kind][name]
+                matches = set()
+                for value in values:
+                    matches.update(index.get(value.strip().lower(), ()))
+                paths = matches if paths is None else paths & matches
+            
+            records = self._records[kind]
+            candidates = [(order_key(records[path]), path, records[path])
+                          for path in (records if paths is None else paths)]
+        
+        total = len(candidates)
+        cursor_order = f"{kind}:{order}"
+        if cursor:
+            after = decode_cursor(cursor, cursor_order)
             try:
-                with open(doc_file, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                    
-                    # Extract title (first h1)
-                    title = os.path.basename(doc_file).replace(".md", "").replace("-", " ").title()
-                    if content.startswith('# '):
-                        title = content.split('\n')[0][2:].strip()
-                    
-                    # Get a summary (first paragraph after title)
-                    summary = ""
-                    in_summary = False
-                    for line in content.split('\n')[1:]:
-                        if line.strip() and not line.startswith('#') and not in_summary:
-                            in_summary = True
-                            summary += line.strip() + " "
-                        elif in_summary and (not line.strip() or line.startswith('#')):
-                            break
-                        elif in_summary:
-                            summary += line.strip() + " "
-                    
-                    # Build PRD doc object
-                    prd_doc = {
-                        "id": str(uuid.uuid4()),
-                        "title": title,
-                        "summary": summary.strip(),
-                        "file_path": doc_file,
-                        "created": datetime.fromtimestamp(os.path.getctime(doc_file)).strftime("%Y-%m-%d"),
-                        "modified": datetime.fromtimestamp(os.path.getmtime(doc_file)).strftime("%Y-%m-%d")
-                    }
-                    
-                    prd_docs.append(prd_doc)
-            except Exception as e:
-                print(f"Error processing PRD file {doc_file}: {e}")
-    
-    return sorted(prd_docs, key=lambda d: d.get('modified', ''), reverse=True)
+                candidates = [c for c in candidates
+                              if ((c[0], c[1]) < after if descending else (c[0], c[1]) > after)]
+            except TypeError:
+                raise ValueError("Invalid cursor")
+        
+        if limit:
+            pick = heapq.nlargest if descending else heapq.nsmallest
+            page = pick(limit, candidates, key=lambda c: (c[0], c[1]))
+        else:
+            page = sorted(candidates, key=lambda c: (c[0], c[1]), reverse=descending)
+        
+        next_cursor = None
+        if limit and len(candidates) > limit:
+            next_cursor = encode_cursor(cursor_order, page[-1][0], page[-1][1])
+        
+        return [record for _, _, record in page], next_cursor, total
+    
+    def max_task_sequence(self, day):
+        """Highest sequence number among task IDs indexed for a day, or 0.
+        
+        Kept as a high-water mark by _add, so deleting a task never lowers it.
+        """
+        self.ensure_loaded()
+        with self._lock:
+            return self._task_days.get(day, 0)
+    
+    def task_path(self, task_id):
+        """Path of the file holding the task with exactly this ID, or None"""
+        self.ensure_loaded()
+        with self._lock:
+            return self._task_paths.get(task_id)
+    
+    def view(self, kind):
+        """Sorted records of a collection plus an ETag for that version.
+        
+        Both are rebuilt only after the collection changes.
+        """
+        self.ensure_loaded()
+        with self._lock:
+            view = self._views.get(kind)
+            if view is None:
+                records = sorted(self._records[kind].values(), key=self.SORT_KEYS[kind], reverse=True)
+                body = json.dumps(records, sort_keys=True, default=str).encode('utf-8')
+                view = (records, f"{kind}-{hashlib.sha1(body).hexdigest()}")
+                self._views[kind] = view
+            return view
+    
+    def refresh(self, path):
+        """Re-parse a single file and update, add or drop its record"""
+        if not self._loaded:
+            return
+        
+        path = os.path.abspath(path)
+        location = classify_doc_path(path)
+        entry = None
+        if location and os.path.isfile(path):
+            try:
+                entry = load_cache_entry(path, *location, cached=self._entries.get(path))
+            except OSError as e:
+                print(f"Error indexing {path}: {e}")
+        
+        with self._lock:
+            previous = self._entries.get(path)
+            if entry is previous:
+                return
+            self._discard(path)
+            if entry:
+                self._add(path, entry)
+                self._publish(entry["kind"], "upsert", entry["record"])
+            elif previous:
+                self._publish(previous["kind"], "delete", record_id=previous["record"].get("id"))
+    
+    def remove(self, path):
+        """Drop the record for a deleted file"""
+        with self._lock:
+            previous = self._discard(os.path.abspath(path))
+            if previous:
+                self._publish(previous["kind"], "delete", record_id=previous["record"].get("id"))
+    
+    def move(self, src_path, dest_path):
+        """Follow a file that was renamed or moved between directories.
+        
+        Moving a file to another category or status directory under the same
+        name keeps its content, so the record is carried over instead of
+        re-reading the file.
+        """
+        src_path, dest_path = os.path.abspath(src_path), os.path.abspath(dest_path)
+        location = classify_doc_path(dest_path)
+        with self._lock:
+            entry = self._entries.get(src_path)
+            if (entry and location and entry["kind"] == location[0]
+                    and os.path.basename(src_path) == os.path.basename(dest_path)):
+                self._discard(src_path)
+                moved = relocate_entry(entry, dest_path, location[1])
+                self._add(dest_path, moved)
+                self._publish(entry["kind"], "move", moved["record"],
+                              previous_id=entry["record"].get("id"), previous_group=entry["group"])
+                return
+        
+        self.remove(src_path)
+        self.refresh(dest_path)
+    
+    def _add(self, path, entry):
+        kind, record = entry["kind"], entry["record"]
+        self._entries[path] = entry
+        self._records[kind][path] = record
+        if kind == "task" and record.get("id"):
+            self._task_paths[record["id"]] = path
+            day, _, sequence = str(record["id"]).rpartition('-')
+            if day and sequence.isdigit():
+                self._task_days[day] = max(self._task_days.get(day, 0), int(sequence))
+        for name, attr in QUERY_FIELDS.get(kind, {}).items():
+            for value in index_values(record.get(attr)):
+                self._fields[kind][name].setdefault(value, set()).add(path)
+        self._views.pop(kind, None)
+    
+    def _publish(self, kind, action, record=None, **extra):
+        if self.changes:
+            self.changes.publish(KIND_COLLECTIONS[kind], action, record, **extra)
+    
+    def _discard(self, path):
+        entry = self._entries.pop(path, None)
+        if entry is None:
+            return None
+        kind, record = entry["kind"], entry["record"]
+        self._records[kind].pop(path, None)
+        if kind == "task" and self._task_paths.get(record.get("id")) == path:
+            del self._task_paths[record["id"]]
+        for name, attr in QUERY_FIELDS.get(kind, {}).items():
+            index = self._fields[kind][name]
+            for value in index_values(record.get(attr)):
+                paths = index.get(value)
+                if paths is not None:
+                    paths.discard(path)
+                    if not paths:
+                        del index[value]
+        self._views.pop(kind, None)
+        return entry
+    
+    def _read_cache(self):
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return {}
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable index cache {self.cache_file}: {e}")
+            return {}
+        if cache.get("version") != INDEX_CACHE_VERSION:
+            return {}
+        return cache.get("entries", {})
+    
+    def save_cache(self):
+        """Write the parsed records to disk via a temp file and rename"""
+        if not self.cache_file:
+            return
+        with self._lock:
+            cache = {"version": INDEX_CACHE_VERSION, "entries": dict(self._entries)}
+        
+        os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+        temp_file = f"{self.cache_file}.tmp"
+        try:
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(cache, f)
+            os.replace(temp_file, self.cache_file)
+        except OSError as e:
+            print(f"Could not write index cache {self.cache_file}: {e}")
+
+changes = ChangeStream()
+doc_index = DocumentIndex(INDEX_CACHE_FILE, SCAN_WORKERS, SCAN_EXECUTOR, changes)
 
 # -------------------- Flask Routes --------------------
 
@@ -440,15 +1037,59 @@ def get_prd_docs():
 def index():
     return render_template('index.html')
 
-# Static files
+# Static files, fingerprinted via asset_url() in templates
 @app.route('/static/<path:path>')
 def send_static(path):
-    return send_from_directory('static', path)
+    return static_assets.send(path)
+
+@app.context_processor
+def asset_helpers():
+    return {"asset_url": lambda path: url_for('send_static', path=static_assets.asset_url(path))}
+
+def conditional_json(data, etag):
+    """jsonify data with an ETag, answering a matching If-None-Match with 304"""
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+    else:
+        response = jsonify(data)
+    # Weak, since the body may be sent gzip- or zstd-encoded under the same tag
+    response.set_etag(etag, weak=True)
+    response.cache_control.no_cache = True
+    return response
+
+def query_collection(kind):
+    """Serve an idea or task listing, honouring filter, sort and paging parameters.
+    
+    Without parameters the whole collection is returned as before. Filters
+    are the QUERY_FIELDS names (repeat one to accept several values), plus
+    `sort`, `limit` and `cursor`. The cursor for the next page is sent in the
+    X-Next-Cursor header, and the number of matches in X-Total-Count.
+    """
+    records, etag = doc_index.view(kind)
+    if not request.args:
+        return conditional_json(records, etag)
+    
+    filters = {name: request.args.getlist(name) for name in QUERY_FIELDS[kind] if name in request.args}
+    try:
+        limit = int(request.args['limit']) if 'limit' in request.args else None
+        if limit is not None and limit < 1:
+            raise ValueError("limit must be a positive integer")
+        items, next_cursor, total = doc_index.query(
+            kind, filters, request.args.get('sort'), limit, request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    
+    query_hash = hashlib.sha1(request.query_string).hexdigest()[:16]
+    response = conditional_json(items, f"{etag}-{query_hash}")
+    response.headers['X-Total-Count'] = str(total)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
 
 # API Routes
 @app.route('/api/ideas', methods=['GET'])
 def api_get_ideas():
-    return jsonify(get_ideas())
+    return query_collection("idea")
 
 @app.route('/api/ideas', methods=['POST'])
 def api_save_idea():
@@ -458,7 +1099,7 @@ def api_save_idea():
 
 @app.route('/api/tasks', methods=['GET'])
 def api_get_tasks():
-    return jsonify(get_tasks())
+    return query_collection("task")
 
 @app.route('/api/tasks', methods=['POST'])
 def api_save_task():
@@ -472,9 +1113,55 @@ def api_update_task_status(task_id):
     result = update_task_status(task_id, new_status)
     return jsonify(result)
 
+@app.route('/api/tasks/status', methods=['PUT'])
+def api_update_task_statuses():
+    data = request.json
+    updates = data.get('updates', []) if isinstance(data, dict) else data
+    if not isinstance(updates, list):
+        return jsonify({"success": False, "error": "Expected a list of updates"}), 400
+    result = update_task_statuses(updates)
+    return jsonify(result)
+
 @app.route('/api/prd', methods=['GET'])
 def api_get_prd():
-    return jsonify(get_prd_docs())
+    return conditional_json(*doc_index.view("prd"))
+
+# Every collection in one response for the first load, each with its version
+BOOTSTRAP_KINDS = ["idea", "task", "prd"]
+
+@app.route('/api/bootstrap', methods=['GET'])
+def api_bootstrap():
+    names = [KIND_COLLECTIONS[kind] for kind in BOOTSTRAP_KINDS]
+    if 'since' in request.args:
+        delta = changes.delta(request.args['since'], names)
+        if delta is None:
+            return jsonify({"success": True, "resync": True, "rev": changes.cursor()})
+        return jsonify(dict(delta, success=True, resync=False))
+    
+    # Taken before the views are read, so a change in between is replayed rather than lost
+    rev = changes.cursor()
+    views = [doc_index.view(kind) for kind in BOOTSTRAP_KINDS]
+    collections = {name: {"version": etag, "items": records} for name, (records, etag) in zip(names, views)}
+    response = conditional_json({"success": True, "rev": rev, "collections": collections},
+                                '.'.join(etag for _, etag in views))
+    response.headers['X-Change-Rev'] = rev
+    return response
+
+@app.route('/api/events', methods=['GET'])
+def api_events():
+    """Server-Sent Events stream of index changes (upsert, delete, move, reload)"""
+    # ?since= gives the first connection a position; reconnects send Last-Event-ID
+    stream = changes.stream(request.headers.get('Last-Event-ID') or request.args.get('since'))
+    return Response(stream, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/stats/render-cache', methods=['GET'])
+def api_render_cache_stats():
+    return jsonify(render_cache.stats())
+
+@app.route('/api/stats/responses', methods=['GET'])
+def api_response_stats():
+    return jsonify(api_responses.stats())
 
 @app.route('/api/file/<path:filepath>', methods=['GET'])
 def api_get_file_content(filepath):
@@ -485,7 +1172,7 @@ def api_get_file_content(filepath):
             
             # For Markdown files, convert to HTML for preview
             if filepath.endswith('.md'):
-                html_content = markdown.markdown(content)
+                html_content = render_cache.render(content)
                 return jsonify({
                     "content": content,
                     "html": html_content,
@@ -507,6 +1194,13 @@ if __name__ == '__main__':
     print(f"Starting {APP_NAME} v{APP_VERSION}...")
     print(f"Data directory: {DATA_DIR}")
     
+    # Build the document index before serving requests
+    doc_index.load(cold_start=True)
+    atexit.register(doc_index.save_cache)
+    static_assets.warm()
+    print(f"Indexed {len(doc_index.ideas())} ideas, {len(doc_index.tasks())} tasks "
+          f"and {len(doc_index.prd_docs())} PRD documents")
+    
     # Watch for file changes
     event_handler = FileChangeHandler()
     observer = Observer()
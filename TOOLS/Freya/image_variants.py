@@ -0,0 +1,137 @@
+"""
+Freya - Image variants
+Resized and re-encoded copies of uploaded images, generated on demand and cached on disk
+"""
+
+import os
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps
+
+# Requested widths are rounded up to one of these so the cache stays small
+VARIANT_WIDTHS = (64, 128, 256, 320, 480, 640, 800, 1024, 1280, 1600, 1920, 2560)
+VARIANT_FORMATS = {
+    'webp': ('WEBP', 'image/webp', '.webp'),
+    'jpeg': ('JPEG', 'image/jpeg', '.jpg'),
+    'jpg': ('JPEG', 'image/jpeg', '.jpg'),
+    'png': ('PNG', 'image/png', '.png')
+}
+
+def snap_width(width):
+    for candidate in VARIANT_WIDTHS:
+        if width <= candidate:
+            return candidate
+    return VARIANT_WIDTHS[-1]
+
+def render_variant(source_path, target_path, width, fmt, quality):
+    """Write a copy of source_path at most width pixels wide, encoded as fmt"""
+    pil_format = VARIANT_FORMATS[fmt][0]
+    with Image.open(source_path) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.width > width:
+            height = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), Image.LANCZOS)
+        if pil_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        elif image.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+            image = image.convert('RGBA')
+
+        temp_path = f"{target_path}.{threading.get_ident()}.tmp"
+        options = {'optimize': True}
+        if pil_format in ('WEBP', 'JPEG'):
+            options['quality'] = quality
+        image.save(temp_path, pil_format, **options)
+    os.replace(temp_path, target_path)
+
+class VariantCache:
+    """Derivatives keyed by source identity, width, format and quality.
+
+    Variants are rendered on a small thread pool (Pillow releases the GIL
+    while resampling and encoding) and concurrent requests for the same
+    variant share one render. The cache directory is kept under max_bytes by
+    evicting the least recently served files.
+    """
+
+    def __init__(self, cache_dir, max_bytes=256 * 1024 * 1024, workers=2):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='freya-variant')
+        self._lock = threading.Lock()
+        self._inflight = {}
+        os.makedirs(cache_dir, exist_ok=True)
+        self._bytes = sum(entry.stat().st_size for entry in os.scandir(cache_dir)
+                          if entry.is_file() and not entry.name.endswith('.tmp'))
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, source_key, width, fmt, quality):
+        raw = f"{source_key}:{width}:{VARIANT_FORMATS[fmt][0]}:{quality}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, source_path, source_key, width, fmt='webp', quality=80):
+        """(path, mimetype, key) of the variant, rendering it first if needed"""
+        width = snap_width(width)
+        _, mimetype, ext = VARIANT_FORMATS[fmt]
+        key = self.key(source_key, width, fmt, quality)
+        path = os.path.join(self.cache_dir, key + ext)
+
+        with self._lock:
+            if os.path.exists(path):
+                self.hits += 1
+                os.utime(path)
+                return path, mimetype, key
+            future = self._inflight.get(key)
+            if future is None:
+                self.misses += 1
+                future = self._inflight[key] = self._executor.submit(
+                    self._render, key, source_path, path, width, fmt, quality)
+
+        future.result()
+        return path, mimetype, key
+
+    def _render(self, key, source_path, path, width, fmt, quality):
+        try:
+            render_variant(source_path, path, width, fmt, quality)
+            with self._lock:
+                self._bytes += os.path.getsize(path)
+                over = self._bytes > self.max_bytes
+            if over:
+                self._evict(keep=path)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _evict(self, keep=None):
+        """Drop least recently served variants until the cache is back to 90% of max_bytes"""
+        entries = sorted((entry for entry in os.scandir(self.cache_dir)
+                          if entry.is_file() and not entry.name.endswith('.tmp')),
+                         key=lambda entry: entry.stat().st_mtime)
+        with self._lock:
+            target = self.max_bytes * 0.9
+            for entry in entries:
+                if self._bytes <= target:
+                    break
+                if entry.path == keep:
+                    continue
+                try:
+                    size = entry.stat().st_size
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    continue
+                self._bytes -= size
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+            }
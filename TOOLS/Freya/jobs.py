@@ -0,0 +1,141 @@
+"""
+Freya - Background jobs
+A small in-process job queue so slow work does not hold a request thread
+"""
+
+import itertools
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 5
+PRIORITY_LOW = 9
+
+class QueueFull(Exception):
+    pass
+
+class Job:
+    """One unit of background work and its progress, as reported by /api/jobs/<id>"""
+
+    def __init__(self, kind, func, args, kwargs, priority):
+        self.id = str(uuid.uuid4())
+        self.kind = kind
+        self.priority = priority
+        self.status = 'queued'
+        self.progress = 0.0
+        self.message = ''
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self._func = func
+        self._args = args
+        self._kwargs = kwargs
+        self._done = threading.Event()
+
+    def update(self, progress=None, message=None):
+        """Called by the job function to report how far along it is (progress is 0..1)"""
+        if progress is not None:
+            self.progress = max(0.0, min(1.0, float(progress)))
+        if message is not None:
+            self.message = message
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": self.progress,
+            "message": self.message,
+            "result": self.result,
+            "error": self.error,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished
+        }
+
+class JobQueue:
+    """A bounded pool of worker threads fed from a priority queue.
+
+    Lower priority numbers run first; jobs of equal priority run in the order
+    they were submitted. At most max_pending jobs may wait at once, after
+    which submit() raises QueueFull. Finished jobs are kept for polling until
+    there are more than `history` of them, oldest first.
+    """
+
+    def __init__(self, workers=2, max_pending=100, history=500):
+        self.max_pending = max_pending
+        self.history = history
+        self._queue = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._finished = 0
+        self._workers = []
+        for i in range(max(1, workers)):
+            worker = threading.Thread(target=self._run, name=f"freya-job-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, kind, func, *args, priority=PRIORITY_NORMAL, **kwargs):
+        """Queue func(job, *args, **kwargs); its return value becomes the job's result"""
+        job = Job(kind, func, args, kwargs, priority)
+        with self._lock:
+            if self._queue.qsize() >= self.max_pending:
+                raise QueueFull(f"Too many pending jobs ({self.max_pending})")
+            self._jobs[job.id] = job
+        self._queue.put((priority, next(self._sequence), job))
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self):
+        while True:
+            _, _, job = self._queue.get()
+            job.status = 'running'
+            job.started = time.time()
+            try:
+                job.result = job._func(job, *job._args, **job._kwargs)
+                job.progress = 1.0
+                job.status = 'succeeded'
+            except Exception as e:
+                job.error = str(e)
+                job.status = 'failed'
+            finally:
+                job.finished = time.time()
+                job._func = job._args = job._kwargs = None
+                job._done.set()
+                self._retire()
+
+    def _retire(self):
+        """Forget the oldest finished jobs once there are more than `history`"""
+        with self._lock:
+            self._finished += 1
+            if self._finished <= self.history:
+                return
+            for job_id, job in list(self._jobs.items()):
+                if self._finished <= self.history:
+                    break
+                if job.done:
+                    del self._jobs[job_id]
+                    self._finished -= 1
+
+    def stats(self):
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return {"workers": len(self._workers), "pending": self._queue.qsize(), "jobs": counts}
@@ -0,0 +1,29 @@
+// Freya - long-lived Mermaid renderer
+// Reads {"code", "options"} JSON lines on stdin and answers each with {"svg"} or {"error"}.
+// One headless browser is launched at startup and reused for every diagram.
+// Run via MERMAID_WORKER="node mermaid_worker.mjs" (needs @mermaid-js/mermaid-cli).
+
+import readline from 'node:readline';
+import puppeteer from 'puppeteer';
+import { renderMermaid } from '@mermaid-js/mermaid-cli';
+
+const browser = await puppeteer.launch({ headless: 'new' });
+const lines = readline.createInterface({ input: process.stdin });
+
+for await (const line of lines) {
+    if (!line.trim()) continue;
+    let reply;
+    try {
+        const { code, options = {} } = JSON.parse(line);
+        const { data } = await renderMermaid(browser, code, 'svg', {
+            backgroundColor: options.background || 'transparent',
+            mermaidConfig: options.theme ? { theme: options.theme } : {},
+        });
+        reply = { svg: Buffer.from(data).toString('utf-8') };
+    } catch (error) {
+        reply = { error: String(error && error.message || error) };
+    }
+    process.stdout.write(JSON.stringify(reply) + '\n');
+}
+
+await browser.close();
@@ -0,0 +1,109 @@
+"""
+Freya - Rendered markdown cache
+Keeps recently rendered HTML in memory so unchanged documents are not re-rendered
+"""
+
+import re
+import hashlib
+import threading
+from collections import OrderedDict
+
+import markdown
+
+SECTION_HEADING = re.compile(r'^ {0,3}(#{1,6})(?:[ \t]|$)')
+CODE_FENCE = re.compile(r'^ {0,3}(`{3,}|~{3,})')
+
+def split_sections(content, level=2):
+    """Split markdown into sections, each starting at a heading of at most `level`.
+
+    Headings inside fenced code blocks do not start a section. Joining the
+    sections gives back the original text.
+    """
+    sections = []
+    current = []
+    fence = None
+    for line in content.splitlines(keepends=True):
+        match = CODE_FENCE.match(line)
+        if fence is None:
+            if match:
+                fence = match.group(1)
+            else:
+                heading = SECTION_HEADING.match(line)
+                if heading and len(heading.group(1)) <= level and current:
+                    sections.append(''.join(current))
+                    current = []
+        elif match and match.group(1)[0] == fence[0] and len(match.group(1)) >= len(fence):
+            fence = None
+        current.append(line)
+    if current:
+        sections.append(''.join(current))
+    return sections
+
+def section_hash(section):
+    return hashlib.sha256(section.encode('utf-8')).hexdigest()[:16]
+
+class RenderCache:
+    """LRU cache of markdown HTML keyed by content hash and extension list.
+
+    Entries are charged by the UTF-8 size of their HTML, and the least
+    recently used ones are evicted once the total passes max_bytes.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def render(self, content, extensions=()):
+        """HTML for content, rendered with the given markdown extensions"""
+        extensions = tuple(extensions)
+        key = (hashlib.sha256(content.encode('utf-8')).hexdigest(), extensions)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        html = markdown.markdown(content, extensions=list(extensions))
+        self._store(key, html)
+        return html
+
+    def _store(self, key, html):
+        size = len(html.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = (html, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+            }
@@ -8,6 +8,9 @@ let ideas = [];
 let tasks = [];
 let prdDocs = [];
 
+// True while the change feed is connected; views are then patched from it instead of re-fetched
+let liveUpdates = false;
+
 // DOM Elements
 document.addEventListener('DOMContentLoaded', () => {
     // Global state
@@ -16,6 +19,7 @@ document.addEventListener('DOMContentLoaded', () => {
         tasks: [],
         images: [],
         diagrams: [],
+        rev: null,
         activeSection: 'dashboard'
     };
 
@@ -44,8 +48,8 @@ document.addEventListener('DOMContentLoaded', () => {
         setupNavigation();
         setupActionButtons();
         
-        // Load initial data
-        loadData();
+        // Load initial data, then follow the change feed from the revision it was read at
+        loadData().then(subscribeToChanges);
     }
 
     // Navigation
@@ -136,30 +140,61 @@ document.addEventListener('DOMContentLoaded', () => {
     // Load data from API
     async function loadData() {
         try {
-            // Load ideas
-            const ideasResponse = await fetch('/api/ideas');
-            state.ideas = await ideasResponse.json();
-
-            // Load tasks
-            const tasksResponse = await fetch('/api/tasks');
-            state.tasks = await tasksResponse.json();
-
-            // Load images
-            const imagesResponse = await fetch('/api/images');
-            state.images = await imagesResponse.json();
-
-            // Load diagrams
-            const diagramsResponse = await fetch('/api/diagrams');
-            state.diagrams = await diagramsResponse.json();
+            // Load every collection the server has in one round trip
+            const response = await fetch('/api/bootstrap');
+            const { rev, collections } = await response.json();
+            const items = name => (collections[name] ? collections[name].items : []);
+            state.ideas = items('ideas');
+            state.tasks = items('tasks');
+            state.images = items('images');
+            state.diagrams = items('diagrams');
+            // The header is refreshed on a 304, the cached body is not
+            state.rev = response.headers.get('X-Change-Rev') || rev;
 
-            // Update dashboard with loaded data
+            // Update dashboard and list views with loaded data
+            ideas = state.ideas;
+            tasks = state.tasks;
             updateDashboard();
+            refreshCollectionViews('ideas');
+            refreshCollectionViews('tasks');
 
         } catch (error) {
             console.error('Error loading data:', error);
         }
     }
 
+    // Apply pushed changes instead of re-fetching whole collections
+    function subscribeToChanges() {
+        if (!window.EventSource) return;
+
+        // Reconnects resume from Last-Event-ID; the first connection starts at the bootstrap revision
+        const url = state.rev ? `/api/events?since=${encodeURIComponent(state.rev)}` : '/api/events';
+        const source = new EventSource(url);
+        source.addEventListener('open', () => { liveUpdates = true; });
+        source.addEventListener('change', (e) => applyChange(JSON.parse(e.data)));
+        source.addEventListener('resync', () => loadData());
+    }
+
+    function applyChange(change) {
+        if (change.action === 'reload') {
+            loadData();
+            return;
+        }
+
+        const items = state[change.collection];
+        if (!Array.isArray(items)) return;
+
+        const updated = items.filter(item => item.id !== change.id && item.id !== change.previous_id);
+        if (change.action !== 'delete') {
+            updated.push(change.record);
+        }
+        state[change.collection] = updated;
+        if (change.collection === 'ideas') ideas = updated;
+        if (change.collection === 'tasks') tasks = updated;
+        updateDashboard();
+        refreshCollectionViews(change.collection);
+    }
+
     // Update dashboard with current data
     function updateDashboard() {
         // Update idea list
@@ -380,6 +415,23 @@ function updateDashboardLists() {
     }
 }
 
+// Re-render the idea list or task board from memory, keeping the active filters
+function refreshCollectionViews(collection) {
+    if (collection === 'ideas' && document.getElementById('ideas-grid')) {
+        if (document.getElementById('idea-search')) {
+            filterIdeas();
+        } else {
+            renderIdeas();
+        }
+    } else if (collection === 'tasks' && document.getElementById('backlog-tasks')) {
+        if (document.getElementById('task-search')) {
+            filterTasks();
+        } else {
+            renderTasks();
+        }
+    }
+}
+
 // Ideas
 function loadIdeas() {
     fetch('/api/ideas')
@@ -535,11 +587,11 @@ function saveIdea() {
             // Close modal
             document.getElementById('idea-modal').style.display = 'none';
             
-            // Reload ideas
-            loadIdeas();
-            
-            // Update dashboard
-            loadDashboardData();
+            // The change feed delivers the saved idea; only re-fetch without it
+            if (!liveUpdates) {
+                loadIdeas();
+                loadDashboardData();
+            }
         } else {
             alert('Error saving idea: ' + (data.error || 'Unknown error'));
         }
@@ -726,11 +778,11 @@ function saveTask() {
             // Close modal
             document.getElementById('task-modal').style.display = 'none';
             
-            // Reload tasks
-            loadTasks();
-            
-            // Update dashboard
-            loadDashboardData();
+            // The change feed delivers the saved task; only re-fetch without it
+            if (!liveUpdates) {
+                loadTasks();
+                loadDashboardData();
+            }
         } else {
             alert('Error saving task: ' + (data.error || 'Unknown error'));
         }
@@ -752,11 +804,15 @@ function updateTaskStatus(taskId, newStatus) {
     .then(response => response.json())
     .then(data => {
         if (data.success) {
-            // Reload tasks
-            loadTasks();
-            
-            // Update dashboard
-            loadDashboardData();
+            // Move the card now; the change feed brings the server's copy of the task
+            const task = tasks.find(t => t.id === taskId);
+            if (task) {
+                task.status = newStatus;
+                refreshCollectionViews('tasks');
+            }
+            if (!liveUpdates) {
+                loadDashboardData();
+            }
         } else {
             alert('Error updating task status: ' + (data.error || 'Unknown error'));
         }
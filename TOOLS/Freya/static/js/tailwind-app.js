@@ -730,7 +730,8 @@ function setupModalEvents(modalContainer, type) {
                 },
                 body: JSON.stringify(data)
             })
-            .then(response => response.json())
+            .then(response => response.status === 202 ?
+                response.json().then(waitForJob) : response.json())
             .then(result => {
                 if (result.success) {
                     // Close the modal
@@ -739,11 +740,11 @@ function setupModalEvents(modalContainer, type) {
                     // Show success notification
                     showNotification(`${type.charAt(0).toUpperCase() + type.slice(1)} created successfully`, 'success');
                     
-                    // Reload the relevant content
+                    // New ideas and tasks arrive over the change feed; re-fetch only without it
                     if (type === 'idea') {
-                        loadIdeas();
+                        if (!liveUpdates) loadIdeas();
                     } else if (type === 'task') {
-                        loadTasks();
+                        if (!liveUpdates) loadTasks();
                     } else if (type === 'diagram') {
                         document.querySelector('.nav-link[data-section="diagrams"]').click();
                     }
@@ -759,6 +760,32 @@ function setupModalEvents(modalContainer, type) {
     }
 }
 
+/**
+ * Poll a background job accepted with 202 until it finishes
+ */
+function waitForJob(accepted, interval = 500) {
+    return new Promise((resolve, reject) => {
+        const poll = () => {
+            fetch(accepted.status_url)
+                .then(response => response.json())
+                .then(result => {
+                    const job = result.job;
+                    if (!result.success) {
+                        resolve(result);
+                    } else if (job.status === 'succeeded') {
+                        resolve({ success: true, ...job.result });
+                    } else if (job.status === 'failed') {
+                        resolve({ success: false, error: job.error });
+                    } else {
+                        setTimeout(poll, interval);
+                    }
+                })
+                .catch(reject);
+        };
+        poll();
+    });
+}
+
 /**
  * Initialize modal functionality
  */
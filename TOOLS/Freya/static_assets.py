@@ -0,0 +1,154 @@
+"""
+Freya - Static asset delivery
+Content-hashed URLs, strong ETags and precompressed gzip/brotli variants for static files
+"""
+
+import os
+import re
+import gzip
+import hashlib
+import mimetypes
+import threading
+
+from flask import current_app, request, send_file, abort
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = {'.css', '.js', '.mjs', '.svg', '.json', '.map', '.html', '.txt', '.md', '.xml'}
+MIN_COMPRESS_SIZE = 1024
+HASHED_NAME = re.compile(r'^(?P<base>.+)\.(?P<hash>[0-9a-f]{12})(?P<ext>\.[^./]+)$')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+
+class StaticAssets:
+    """Serves the files under root.
+
+    asset_url('css/app.css') gives 'css/app.<hash>.css', where hash is taken
+    from the file's content. A request for that name is answered with a
+    one-year immutable Cache-Control, because any edit changes the URL.
+    Plain names still work and are revalidated against a strong ETag. Text
+    assets are compressed once per content hash into cache_dir and sent
+    as-is to clients that accept br (when the brotli package is installed)
+    or gzip. Paths under one of immutable_prefixes are treated as
+    content-addressed already and cached for good under their plain name.
+    """
+
+    def __init__(self, root, cache_dir, immutable_prefixes=()):
+        self.root = root
+        self.cache_dir = cache_dir
+        self.immutable_prefixes = tuple(immutable_prefixes)
+        self._lock = threading.Lock()
+        self._hashes = {}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def content_hash(self, path):
+        """Hash of a file's content, recomputed only when its mtime or size change"""
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._hashes.get(path)
+            if cached and cached[0] == signature:
+                return cached[1]
+
+        sha256 = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(64 * 1024), b''):
+                sha256.update(chunk)
+        digest = sha256.hexdigest()
+        with self._lock:
+            self._hashes[path] = (signature, digest)
+        return digest
+
+    def asset_url(self, rel_path):
+        """The fingerprinted name of rel_path, or rel_path itself if it does not exist"""
+        path = safe_join(self.root, rel_path)
+        if path is None or not os.path.isfile(path):
+            return rel_path
+        base, ext = os.path.splitext(rel_path)
+        return f"{base}.{self.content_hash(path)[:12]}{ext}"
+
+    def _resolve(self, rel_path):
+        """(file path, cache forever?) for a plain or fingerprinted request path"""
+        path = safe_join(self.root, rel_path)
+        if path is not None and os.path.isfile(path):
+            return path, rel_path.startswith(self.immutable_prefixes)
+
+        match = HASHED_NAME.match(rel_path)
+        if match:
+            path = safe_join(self.root, match.group('base') + match.group('ext'))
+            if path is not None and os.path.isfile(path):
+                # A stale fingerprint still gets the current file, just not cached for good
+                return path, self.content_hash(path).startswith(match.group('hash'))
+        return None, False
+
+    def _encoded(self, path, digest, encoding):
+        """Path to the compressed copy of a file, building it on first use"""
+        encoded_path = os.path.join(self.cache_dir, f"{digest}.{encoding}")
+        if os.path.exists(encoded_path):
+            return encoded_path
+
+        with open(path, 'rb') as f:
+            data = f.read()
+        if encoding == 'br':
+            data = brotli.compress(data, quality=11)
+        else:
+            data = gzip.compress(data, compresslevel=9, mtime=0)
+        temp_path = f"{encoded_path}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, encoded_path)
+        return encoded_path
+
+    def _choose_encoding(self, path):
+        ext = os.path.splitext(path)[1].lower()
+        if ext not in COMPRESSIBLE_TYPES or os.path.getsize(path) < MIN_COMPRESS_SIZE:
+            return None
+        accepted = request.accept_encodings
+        if brotli is not None and accepted['br']:
+            return 'br'
+        if accepted['gzip']:
+            return 'gzip'
+        return None
+
+    def send(self, rel_path):
+        """Response for GET <prefix>/<rel_path>"""
+        path, immutable = self._resolve(rel_path)
+        if path is None:
+            abort(404)
+
+        digest = self.content_hash(path)
+        encoding = self._choose_encoding(path)
+        etag = f"{digest[:32]}-{encoding}" if encoding else digest[:32]
+        mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+        if request.if_none_match.contains(etag):
+            response = current_app.response_class(status=304)
+        elif encoding:
+            response = send_file(self._encoded(path, digest, encoding), mimetype=mimetype, conditional=False)
+            response.headers['Content-Encoding'] = encoding
+        else:
+            response = send_file(path, mimetype=mimetype, conditional=False)
+
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = IMMUTABLE if immutable else REVALIDATE
+        if os.path.splitext(path)[1].lower() in COMPRESSIBLE_TYPES:
+            response.vary.add('Accept-Encoding')
+        return response
+
+    def warm(self):
+        """Compress every text asset up front so the first visitor does not pay for it"""
+        for dirpath, _, files in os.walk(self.root):
+            for name in files:
+                path = os.path.join(dirpath, name)
+                if os.path.splitext(name)[1].lower() not in COMPRESSIBLE_TYPES:
+                    continue
+                if os.path.getsize(path) < MIN_COMPRESS_SIZE:
+                    continue
+                digest = self.content_hash(path)
+                self._encoded(path, digest, 'gzip')
+                if brotli is not None:
+                    self._encoded(path, digest, 'br')
@@ -0,0 +1,284 @@
+"""
+Freya - Record stores
+Pluggable storage for the JSON-style collections (ideas, tasks, images, diagrams)
+"""
+
+import os
+import json
+import atexit
+import concurrent.futures
+import sqlite3
+import threading
+import uuid
+import weakref
+
+class JsonStore:
+    """A collection kept as a JSON array in a single file.
+
+    The file is read once and the records stay resident, with an id -> position
+    index so lookups and updates never scan the list. Writes only mark the
+    store dirty; a write-behind timer then coalesces every change made within
+    flush_interval seconds into one atomic temp-file-plus-rename. Edits made
+    to the file by hand while the app is running are not picked up.
+    """
+
+    def __init__(self, name, path, flush_interval=0.5):
+        self.name = name
+        self.path = path
+        self.flush_interval = flush_interval
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()
+        self._items = None
+        self._positions = {}
+        self._version = 0
+        self._epoch = uuid.uuid4().hex[:8]
+        self._timer = None
+        self._flushed_version = None
+        _open_json_stores.add(self)
+
+    def _load(self):
+        if self._items is None:
+            items = []
+            if os.path.exists(self.path):
+                with open(self.path, 'r') as f:
+                    items = json.load(f)
+            self._items = items
+            self._positions = {item.get('id'): i for i, item in enumerate(items) if item.get('id') is not None}
+        return self._items
+
+    def all(self):
+        with self._lock:
+            return list(self._load())
+
+    def get(self, record_id):
+        """A copy of the record with this id, or None"""
+        with self._lock:
+            items = self._load()
+            position = self._positions.get(record_id)
+            return dict(items[position]) if position is not None else None
+
+    def put(self, record):
+        self.put_many([record])
+        return record
+
+    def put_many(self, records):
+        """Insert or replace records by id and schedule one flush for the batch"""
+        with self._lock:
+            items = self._load()
+            for record in records:
+                position = self._positions.get(record.get('id'))
+                if position is not None:
+                    items[position] = record
+                else:
+                    if record.get('id') is not None:
+                        self._positions[record['id']] = len(items)
+                    items.append(record)
+            self._version += 1
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self._timer is None:
+            self._timer = threading.Timer(self.flush_interval, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        """Write pending changes now, via a temp file and rename"""
+        with self._flush_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                if self._items is None:
+                    return
+                version = self._version
+                data = json.dumps(self._items, indent=2)
+
+            if self._flushed_version == version:
+                return
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w') as f:
+                f.write(data)
+            os.replace(temp_path, self.path)
+            self._flushed_version = version
+
+    def version(self):
+        """Changes with every write; cheap enough to call per request"""
+        with self._lock:
+            self._load()
+            return f"{self.name}-{self._epoch}-{self._version}"
+
+    def snapshot(self):
+        """(version, records) taken together, so the version describes exactly these records"""
+        with self._lock:
+            items = self._load()
+            return f"{self.name}-{self._epoch}-{self._version}", list(items)
+
+# Flushed on exit so nothing waiting on a write-behind timer is lost
+_open_json_stores = weakref.WeakSet()
+
+@atexit.register
+def flush_json_stores():
+    for store in list(_open_json_stores):
+        store.flush()
+
+class SqliteStore:
+    """A collection kept as rows in an embedded SQLite database.
+
+    All collections share one WAL-mode database file. Each record is stored
+    as JSON alongside indexed id, status and created columns, so a write
+    touches one row instead of the whole collection. Insertion order is kept
+    through the autoincrement seq column. The decoded records are kept for
+    the collection version they were read at, so reads only decode rows again
+    after a write, from this process or another.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS records (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            collection TEXT NOT NULL,
+            id TEXT NOT NULL,
+            status TEXT,
+            created TEXT,
+            modified TEXT,
+            data TEXT NOT NULL,
+            UNIQUE (collection, id)
+        );
+        CREATE INDEX IF NOT EXISTS records_status ON records (collection, status);
+        CREATE INDEX IF NOT EXISTS records_created ON records (collection, created);
+        CREATE TABLE IF NOT EXISTS collections (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0,
+            migrated INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+    """
+
+    _local = threading.local()
+    _initialised = set()
+    _init_lock = threading.Lock()
+
+    def __init__(self, name, db_path):
+        self.name = name
+        self.db_path = db_path
+        self._decoded = (None, [])
+        with self._init_lock:
+            if db_path not in self._initialised:
+                conn = self._connect()
+                conn.executescript(self.SCHEMA)
+                conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('epoch', ?)",
+                             (uuid.uuid4().hex[:8],))
+                conn.commit()
+                self._initialised.add(db_path)
+
+        conn = self._connect()
+        conn.execute("INSERT OR IGNORE INTO collections (name) VALUES (?)", (name,))
+        conn.commit()
+        self.epoch = conn.execute("SELECT value FROM meta WHERE key = 'epoch'").fetchone()[0]
+
+    def _connect(self):
+        """One connection per thread and database file"""
+        connections = getattr(self._local, 'connections', None)
+        if connections is None:
+            connections = self._local.connections = {}
+        conn = connections.get(self.db_path)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            connections[self.db_path] = conn
+        return conn
+
+    def all(self):
+        return self.snapshot()[1]
+
+    def get(self, record_id):
+        row = self._connect().execute(
+            "SELECT data FROM records WHERE collection = ? AND id = ?", (self.name, record_id)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, record):
+        self.put_many([record])
+        return record
+
+    def put_many(self, records):
+        """Insert or replace records by id in a single transaction"""
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                """INSERT INTO records (collection, id, status, created, modified, data)
+                   VALUES (?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (collection, id) DO UPDATE SET
+                       status = excluded.status, created = excluded.created,
+                       modified = excluded.modified, data = excluded.data""",
+                [(self.name, str(record.get('id')), record.get('status'), record.get('created'),
+                  record.get('modified'), json.dumps(record)) for record in records])
+            conn.execute("UPDATE collections SET version = version + 1 WHERE name = ?", (self.name,))
+
+    def version(self):
+        row = self._connect().execute(
+            "SELECT version FROM collections WHERE name = ?", (self.name,)).fetchone()
+        return f"{self.name}-{self.epoch}-{row[0] if row else 0}"
+
+    def snapshot(self):
+        """(version, records) read in one transaction, decoding rows only if the version moved"""
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN")
+            row = conn.execute(
+                "SELECT version FROM collections WHERE name = ?", (self.name,)).fetchone()
+            version = f"{self.name}-{self.epoch}-{row[0] if row else 0}"
+            decoded_version, records = self._decoded
+            if decoded_version != version:
+                rows = conn.execute(
+                    "SELECT data FROM records WHERE collection = ? ORDER BY seq", (self.name,)).fetchall()
+                records = [json.loads(data) for (data,) in rows]
+                self._decoded = (version, records)
+        return version, list(records)
+
+    def migrate_from(self, source):
+        """Import a JsonStore's records once, the first time this collection is opened"""
+        conn = self._connect()
+        row = conn.execute("SELECT migrated FROM collections WHERE name = ?", (self.name,)).fetchone()
+        if row and row[0]:
+            return 0
+
+        records = source.all()
+        records = [record for record in records if record.get('id') is not None]
+        if records:
+            self.put_many(records)
+        with conn:
+            conn.execute("UPDATE collections SET migrated = 1 WHERE name = ?", (self.name,))
+        return len(records)
+
+# Long-lived readers, so SQLite connections are reused across requests
+_readers = None
+_readers_lock = threading.Lock()
+
+def read_collections(stores):
+    """{name: (version, records)} for several stores, read in parallel"""
+    global _readers
+    with _readers_lock:
+        if _readers is None:
+            _readers = concurrent.futures.ThreadPoolExecutor(max_workers=8, thread_name_prefix='store-reader')
+    futures = {store.name: _readers.submit(store.snapshot) for store in stores}
+    return {name: future.result() for name, future in futures.items()}
+
+def open_store(name, json_path, backend='sqlite', db_path=None):
+    """Open a collection on the configured backend.
+
+    The SQLite backend imports the existing JSON file the first time a
+    collection is opened, so switching backends keeps the data.
+    """
+    json_store = JsonStore(name, json_path)
+    if backend == 'json':
+        return json_store
+    if backend != 'sqlite':
+        raise ValueError(f"Unknown storage backend: {backend}")
+
+    store = SqliteStore(name, db_path)
+    store.migrate_from(json_store)
+    return store
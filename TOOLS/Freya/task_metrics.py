@@ -0,0 +1,163 @@
+"""
+Freya - Task metrics
+Status, priority and per-day creation counts kept up to date as tasks change
+"""
+
+import threading
+from collections import Counter
+from datetime import datetime
+
+DEFAULT_STATUSES = ['todo', 'in_progress', 'completed']
+DEFAULT_PRIORITIES = ['low', 'medium', 'high']
+
+def created_date(task):
+    """The YYYY-MM-DD a task was created on, or None if it has no usable timestamp"""
+    created = task.get('created')
+    if not created:
+        return None
+    try:
+        return datetime.fromisoformat(str(created)).date().isoformat()
+    except ValueError:
+        return None
+
+def decrement(counts, key):
+    counts[key] -= 1
+    if counts[key] <= 0:
+        del counts[key]
+
+class TaskMetrics:
+    """Aggregates for /api/metrics/tasks, maintained incrementally.
+
+    Each task's contribution (status, priority, creation day) is remembered
+    by id, so an update only moves that task between buckets. The counts are
+    tagged with the store version they reflect; if the store has changed
+    behind our back (another process, a hand-edited file) the next snapshot
+    rebuilds them from scratch.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.Lock()
+        self._contributions = {}
+        self._status_counts = Counter()
+        self._priority_counts = Counter()
+        self._day_counts = Counter()
+        self._with_priority = 0
+        self._version = None
+
+    def _add(self, task):
+        status, has_priority, priority, day = contribution = (
+            task.get('status'), 'priority' in task, task.get('priority'), created_date(task))
+        if status is not None:
+            self._status_counts[status] += 1
+        if has_priority:
+            self._with_priority += 1
+            if priority is not None:
+                self._priority_counts[priority] += 1
+        if day is not None:
+            self._day_counts[day] += 1
+        self._contributions[task.get('id')] = contribution
+
+    def _remove(self, task_id):
+        contribution = self._contributions.pop(task_id, None)
+        if contribution is None:
+            return
+        status, has_priority, priority, day = contribution
+        if status is not None:
+            decrement(self._status_counts, status)
+        if has_priority:
+            self._with_priority -= 1
+            if priority is not None:
+                decrement(self._priority_counts, priority)
+        if day is not None:
+            decrement(self._day_counts, day)
+
+    def rebuild(self):
+        with self._lock:
+            version = self.store.version()
+            self._contributions.clear()
+            self._status_counts.clear()
+            self._priority_counts.clear()
+            self._day_counts.clear()
+            self._with_priority = 0
+            for task in self.store.all():
+                self._add(task)
+            self._version = version
+
+    def update(self, tasks):
+        """Account for tasks that were just written to the store"""
+        with self._lock:
+            if self._version is None:
+                return
+            for task in tasks:
+                self._remove(task.get('id'))
+                self._add(task)
+            self._version = self.store.version()
+
+    def snapshot(self):
+        """The aggregates in the shape the dashboard charts expect"""
+        if self._version != self.store.version():
+            self.rebuild()
+
+        with self._lock:
+            if not self._contributions:
+                return {
+                    "status_counts": {status: 0 for status in DEFAULT_STATUSES},
+                    "priority_counts": {priority: 0 for priority in DEFAULT_PRIORITIES},
+                    "timeline_data": []
+                }
+
+            status_counts = dict(self._status_counts)
+            for status in DEFAULT_STATUSES:
+                status_counts.setdefault(status, 0)
+
+            priority_counts = {}
+            if self._with_priority:
+                priority_counts = dict(self._priority_counts)
+                for priority in DEFAULT_PRIORITIES:
+                    priority_counts.setdefault(priority, 0)
+
+            timeline_data = [{"date": day, "count": count} for day, count in sorted(self._day_counts.items())]
+
+        return {
+            "status_counts": status_counts,
+            "priority_counts": priority_counts,
+            "timeline_data": timeline_data
+        }
+
+def compute_with_pandas(tasks):
+    """The same aggregates computed in one pass with pandas.
+
+    Not used by the app; handy for offline reports or for checking the
+    incremental counts against a full recomputation. Requires pandas.
+    """
+    import pandas as pd
+
+    df = pd.DataFrame(tasks)
+    if len(df) == 0:
+        return {
+            "status_counts": {status: 0 for status in DEFAULT_STATUSES},
+            "priority_counts": {priority: 0 for priority in DEFAULT_PRIORITIES},
+            "timeline_data": []
+        }
+
+    status_counts = df['status'].value_counts().to_dict() if 'status' in df.columns else {}
+    for status in DEFAULT_STATUSES:
+        status_counts.setdefault(status, 0)
+
+    priority_counts = {}
+    if 'priority' in df.columns:
+        priority_counts = df['priority'].value_counts().to_dict()
+        for priority in DEFAULT_PRIORITIES:
+            priority_counts.setdefault(priority, 0)
+
+    timeline_data = []
+    if 'created' in df.columns:
+        dates = pd.to_datetime(df['created'], errors='coerce').dt.date.dropna()
+        timeline_data = [{"date": str(day), "count": int(count)} for day, count in dates.value_counts().sort_index().items()]
+
+    return {
+        "status_counts": status_counts,
+        "priority_counts": priority_counts,
+        "timeline_data": timeline_data
+    }
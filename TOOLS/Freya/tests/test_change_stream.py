@@ -0,0 +1,46 @@
+from change_stream import ChangeStream
+
+def test_delta_collapses_changes_to_the_last_state_of_each_record():
+    changes = ChangeStream()
+    since = changes.cursor()
+    changes.publish('ideas', 'upsert', {"id": "a", "title": "first"})
+    changes.publish('ideas', 'upsert', {"id": "a", "title": "second"})
+    changes.publish('ideas', 'upsert', {"id": "b", "title": "gone soon"})
+    changes.publish('ideas', 'delete', record_id="b")
+    changes.publish('tasks', 'move', {"id": "t2"}, previous_id="t1")
+    changes.publish('images', 'upsert', {"id": "i"})
+
+    delta = changes.delta(since, ['ideas', 'tasks'])
+    assert delta["rev"] == changes.cursor()
+    assert delta["collections"] == {
+        "ideas": {"upserts": [{"id": "a", "title": "second"}], "deleted": ["b"]},
+        "tasks": {"upserts": [{"id": "t2"}], "deleted": ["t1"]},
+    }
+
+def test_delta_at_the_current_revision_is_empty():
+    changes = ChangeStream()
+    changes.publish('ideas', 'upsert', {"id": "a"})
+    delta = changes.delta(changes.cursor(), ['ideas'])
+    assert delta["collections"] == {"ideas": {"upserts": [], "deleted": []}}
+
+def test_delta_asks_for_a_resync_when_it_cannot_be_answered():
+    changes = ChangeStream(history_size=2)
+    since = changes.cursor()
+    for i in range(3):
+        changes.publish('ideas', 'upsert', {"id": str(i)})
+    # Older than the history
+    assert changes.delta(since, ['ideas']) is None
+    # From another process, or garbage
+    assert changes.delta(f"other-{changes.last_id}", ['ideas']) is None
+    assert changes.delta("nonsense", ['ideas']) is None
+    # A full reload since
+    since = changes.cursor()
+    changes.publish('*', 'reload')
+    assert changes.delta(since, ['ideas']) is None
+
+def test_reload_of_an_unrelated_collection_does_not_force_a_resync():
+    changes = ChangeStream()
+    since = changes.cursor()
+    changes.publish('images', 'reload')
+    changes.publish('ideas', 'upsert', {"id": "a"})
+    assert changes.delta(since, ['ideas'])["collections"]["ideas"]["upserts"] == [{"id": "a"}]
@@ -0,0 +1,103 @@
+import sys
+import threading
+import textwrap
+
+import pytest
+
+from diagram_renderer import DiagramRenderer, RenderError
+
+# Speaks the worker protocol. Every render is logged to calls.log; the code
+# selects misbehaviour: "slow" waits a bit, "crash" exits, "hang" never
+# answers. With a noisy.flag file present, the first process prints a
+# warm-up line before any reply.
+STUB = textwrap.dedent('''
+    import json, os, sys, time
+    here = os.path.dirname(os.path.abspath(__file__))
+    flag = os.path.join(here, 'noisy.flag')
+    if os.path.exists(flag):
+        os.remove(flag)
+        print("warming up", flush=True)
+    for line in sys.stdin:
+        request = json.loads(line)
+        code = request["code"]
+        with open(os.path.join(here, 'calls.log'), 'a') as f:
+            f.write(code + "\\n")
+        if code == "crash":
+            sys.exit(1)
+        if code == "hang":
+            time.sleep(60)
+        if code == "slow":
+            time.sleep(0.3)
+        print(json.dumps({"svg": f"<svg>{code}</svg>"}), flush=True)
+''')
+
+@pytest.fixture
+def stub(tmp_path):
+    script = tmp_path / 'stub_worker.py'
+    script.write_text(STUB)
+    return tmp_path
+
+def make_renderer(stub, workers=2, timeout=5):
+    command = [sys.executable, str(stub / 'stub_worker.py')]
+    return DiagramRenderer(str(stub / 'cache'), worker_command=command, workers=workers, timeout=timeout)
+
+def calls(stub):
+    log = stub / 'calls.log'
+    return log.read_text().split() if log.exists() else []
+
+def test_second_render_is_a_cache_hit(stub):
+    renderer = make_renderer(stub)
+    try:
+        assert renderer.render('A') == ('<svg>A</svg>', False)
+        assert renderer.render('A') == ('<svg>A</svg>', True)
+        assert renderer.lookup('A') == '<svg>A</svg>'
+        assert calls(stub) == ['A']
+        assert renderer.stats()["misses"] == 1
+    finally:
+        renderer.close()
+
+def test_concurrent_requests_share_one_render(stub):
+    renderer = make_renderer(stub, workers=4)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(renderer.render('slow'))) for _ in range(6)]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert [svg for svg, _ in results] == ['<svg>slow</svg>'] * 6
+        assert sum(1 for _, cached in results if not cached) == 1
+        assert calls(stub) == ['slow']
+    finally:
+        renderer.close()
+
+def test_crashed_worker_is_replaced(stub):
+    renderer = make_renderer(stub, workers=1)
+    try:
+        with pytest.raises(RenderError):
+            renderer.render('crash')
+        assert renderer.render('B') == ('<svg>B</svg>', False)
+        assert renderer.lookup('crash') is None
+    finally:
+        renderer.close()
+
+def test_hung_worker_times_out_and_is_replaced(stub):
+    renderer = make_renderer(stub, workers=1, timeout=1)
+    try:
+        with pytest.raises(RenderError):
+            renderer.render('hang')
+        assert renderer.render('B') == ('<svg>B</svg>', False)
+    finally:
+        renderer.close()
+
+def test_noisy_worker_never_answers_with_another_diagram(stub):
+    (stub / 'noisy.flag').write_text('')
+    renderer = make_renderer(stub, workers=1)
+    try:
+        with pytest.raises(RenderError):
+            renderer.render('A')
+        assert renderer.render('B') == ('<svg>B</svg>', False)
+        assert renderer.lookup('A') is None
+        assert renderer.render('A') == ('<svg>A</svg>', False)
+    finally:
+        renderer.close()
@@ -0,0 +1,66 @@
+import difflib
+
+import pytest
+
+from doc_patch import (PatchError, VersionConflict, apply_line_edits, apply_unified_diff,
+                       content_version, patch_file)
+
+BASE = "one\ntwo\nthree\nfour\n"
+
+def unified_diff(old, new):
+    return ''.join(difflib.unified_diff(old.splitlines(keepends=True), new.splitlines(keepends=True)))
+
+def test_line_edits_replace_insert_and_delete_against_the_base():
+    edits = [
+        {"start": 3, "end": 4, "text": ""},
+        {"start": 0, "end": 1, "text": "ONE\n"},
+        {"start": 2, "end": 2, "text": "two and a half\n"},
+    ]
+    assert apply_line_edits(BASE, edits) == "ONE\ntwo\ntwo and a half\nthree\n"
+
+@pytest.mark.parametrize("edits", [
+    5,
+    [1],
+    [{"start": 0}],
+    [{"start": "a", "end": 1}],
+    [{"start": 0, "end": 1, "text": 7}],
+    [{"start": 2, "end": 9}],
+    [{"start": 0, "end": 2}, {"start": 1, "end": 3}],
+])
+def test_malformed_or_overlapping_line_edits_are_refused(edits):
+    with pytest.raises(PatchError):
+        apply_line_edits(BASE, edits)
+
+def test_unified_diff_round_trips():
+    new = "one\n2\nthree\nfour\nfive"
+    assert apply_unified_diff(BASE, unified_diff(BASE, new)) == new
+
+def test_unified_diff_with_stale_context_is_refused():
+    diff = unified_diff(BASE, "one\n2\nthree\nfour\n")
+    with pytest.raises(PatchError):
+        apply_unified_diff("one\nTWO\nthree\nfour\n", diff)
+
+def test_patch_file_writes_the_result_and_returns_its_version(tmp_path):
+    path = tmp_path / 'doc.md'
+    path.write_bytes(b"one\r\ntwo\r\n")
+    version = patch_file(str(path), content_version(path.read_bytes()),
+                         edits=[{"start": 1, "end": 2, "text": "TWO\n"}])
+    # Edits address the text with LF line endings, as GET serves it
+    assert path.read_bytes() == b"one\nTWO\n"
+    assert version == content_version(b"one\nTWO\n")
+
+def test_patch_file_refuses_a_stale_base_with_the_current_version(tmp_path):
+    path = tmp_path / 'doc.md'
+    path.write_text(BASE)
+    with pytest.raises(VersionConflict) as conflict:
+        patch_file(str(path), content_version("something older"), edits=[])
+    assert conflict.value.version == content_version(BASE)
+    assert path.read_text() == BASE
+
+def test_patch_file_leaves_the_file_alone_when_the_diff_does_not_apply(tmp_path):
+    path = tmp_path / 'doc.md'
+    path.write_text(BASE)
+    diff = unified_diff("zero\n", "nothing\n")
+    with pytest.raises(PatchError):
+        patch_file(str(path), content_version(BASE), diff=diff)
+    assert path.read_text() == BASE
@@ -0,0 +1,24 @@
+import numpy as np
+
+from downsample import downsample
+
+def test_y_only_series_keeps_original_indices_as_x():
+    y = [float(i % 97) for i in range(10000)]
+    x, y_kept = downsample([], y, 100)
+    assert len(x) == len(y_kept) == 100
+    assert x[0] == 0 and x[-1] == 9999
+    assert np.array_equal(y_kept, np.asarray(y)[x])
+
+def test_categorical_x_is_kept_alongside_y():
+    x = [f"t{i}" for i in range(1000)]
+    y = list(range(1000))
+    x_kept, y_kept = downsample(x, y, 50, method='minmax')
+    assert [int(label[1:]) for label in x_kept] == list(y_kept)
+
+def test_series_of_different_lengths_are_cut_to_the_shorter():
+    x = [f"t{i}" for i in range(500)]
+    y = list(range(1000))
+    x_kept, y_kept = downsample(x, y, 50)
+    assert len(x_kept) == len(y_kept) == 50
+    assert x_kept[-1] == "t499" and y_kept[-1] == 499
+    assert downsample(x, y, 600) == (x, y[:500])
@@ -0,0 +1,94 @@
+import threading
+
+import pytest
+
+import freya
+
+@pytest.fixture
+def docs(tmp_path, monkeypatch):
+    """An empty docs tree with a fresh index and task counter"""
+    data_dir = tmp_path / 'docs'
+    monkeypatch.setattr(freya, 'DATA_DIR', str(data_dir))
+    monkeypatch.setattr(freya, 'IDEAS_DIR', str(data_dir / 'Ideas'))
+    monkeypatch.setattr(freya, 'TASKS_DIR', str(data_dir / 'Development' / 'Tasks'))
+    monkeypatch.setattr(freya, 'PRD_DIR', str(data_dir / 'PRD'))
+    monkeypatch.setattr(freya, 'TASK_COUNTER_FILE', str(tmp_path / 'data' / 'task_counter.json'))
+    monkeypatch.setattr(freya, 'doc_index', freya.DocumentIndex(workers=1))
+    freya.ensure_dirs()
+    return data_dir
+
+def write_idea(docs, name, title, total):
+    path = docs / 'Ideas' / 'Gameplay' / f'{name}.md'
+    path.write_text(f"# {title}\n\n## Score\n- **Total Score**: {total}\n")
+    return path
+
+def write_task(docs, task_id, status='Backlog'):
+    path = docs / 'Development' / 'Tasks' / status / f'{task_id}-task.md'
+    path.write_text(f"# Task: {task_id}\n\n## Basic Information\n- **ID**: {task_id}\n")
+    return path
+
+def all_pages(order, limit):
+    pages, cursor = [], None
+    while True:
+        records, cursor, total = freya.doc_index.query("idea", order=order, limit=limit, cursor=cursor)
+        pages.append(records)
+        if cursor is None:
+            return pages, total
+
+def test_cursor_pages_cover_the_collection_once_in_order(docs):
+    for i in range(23):
+        # Ties on score are broken by path
+        write_idea(docs, f'idea-{i:02d}', f'Idea {i:02d}', i % 5)
+    everything, _, _ = freya.doc_index.query("idea", order="-score")
+
+    pages, total = all_pages("-score", 10)
+    assert total == 23
+    assert [len(page) for page in pages] == [10, 10, 3]
+    assert [r["file_path"] for page in pages for r in page] == [r["file_path"] for r in everything]
+
+def test_cursor_keeps_its_place_when_records_come_and_go(docs):
+    paths = [write_idea(docs, f'idea-{i:02d}', f'Idea {i:02d}', 0) for i in range(6)]
+    first, cursor, _ = freya.doc_index.query("idea", order="title", limit=3)
+    assert [r["title"] for r in first] == ["Idea 00", "Idea 01", "Idea 02"]
+
+    freya.doc_index.remove(str(paths[0]))
+    freya.doc_index.refresh(str(write_idea(docs, 'idea-99', 'Idea 99', 0)))
+    rest, cursor, _ = freya.doc_index.query("idea", order="title", limit=10, cursor=cursor)
+    assert [r["title"] for r in rest] == ["Idea 03", "Idea 04", "Idea 05", "Idea 99"]
+    assert cursor is None
+
+def test_cursor_is_refused_for_another_order_or_when_garbled(docs):
+    for i in range(3):
+        write_idea(docs, f'idea-{i}', f'Idea {i}', i)
+    _, cursor, _ = freya.doc_index.query("idea", order="title", limit=1)
+    with pytest.raises(ValueError, match="different sort order"):
+        freya.doc_index.query("idea", order="-title", limit=1, cursor=cursor)
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        freya.doc_index.query("idea", order="title", limit=1, cursor="not-a-cursor")
+
+def test_concurrent_allocations_get_distinct_ids_above_existing_tasks(docs):
+    write_task(docs, '2031-01-02-41', status='Done')
+    ids = []
+    lock = threading.Lock()
+
+    def allocate():
+        for _ in range(10):
+            task_id = freya.allocate_task_id('2031-01-02')
+            with lock:
+                ids.append(task_id)
+
+    threads = [threading.Thread(target=allocate) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(set(ids)) == 80
+    assert sorted(int(task_id.rsplit('-', 1)[1]) for task_id in ids) == list(range(42, 122))
+
+def test_allocation_skips_ids_that_arrive_outside_the_counter(docs):
+    assert freya.allocate_task_id('2031-01-02') == '2031-01-02-01'
+    freya.doc_index.refresh(str(write_task(docs, '2031-01-02-07')))
+    assert freya.allocate_task_id('2031-01-02') == '2031-01-02-08'
+    # A new day starts over
+    assert freya.allocate_task_id('2031-01-03') == '2031-01-03-01'